@@ -1,8 +1,18 @@
 #!/usr/bin/env python
 '''Check and sort import statement from a python file '''
 
+import codecs
+import itertools
+import os
 import re
 import sys
+import time
+
+from array import array
+from contextlib import contextmanager
+
+# argparse, json, multiprocessing, signal and subprocess are imported by the functions using
+# them: checking a single file, from an editor or a hook, must not pay for their import
 
 
 class CheckImports(object):
@@ -14,20 +24,46 @@ class CheckImports(object):
 
     _regexImport = re.compile(r"^import\s+(.*)")
     _regexFromImport = re.compile(r"^from\s+([a-zA-Z0-9\._]+)\s+import\s+(.*)$")
+    # Whole-buffer equivalents of the two expressions above. '[^\S\n]' is used instead of '\s' so
+    # a match never spans over a line break, and the '\r' of a CRLF line break is not taken as
+    # the whitespace following 'import': "import\r\n" is no more an import line than "import\n"
+    _importLinePattern = (r"(?:import(?!\r\n)[^\S\n]+|"
+                          r"from[^\S\n]+[a-zA-Z0-9\._]+[^\S\n]+import(?!\r\n)[^\S\n]+).*$")
+    _regexImportLine = re.compile("^" + _importLinePattern, re.MULTILINE)
+    # Only used on the first line of a file starting with an UTF-8 byte order mark
+    _regexImportLineAfterBOM = re.compile(_importLinePattern, re.MULTILINE)
+    # Lines that reset the order check: empty, blank or comment-only lines
+    _regexGroupSeparator = re.compile(r"^[^\S\n]*(?:#|$)", re.MULTILINE)
+    # PEP 263 coding declaration, only looked for in the first two lines
+    _regexCodingCookie = re.compile(r"^[ \t\f]*#.*?coding[:=][ \t]*([-\w.]+)")
+    # The endianness declared by the byte order mark is kept when the content is encoded back
+    _byteOrderMarks = [(codecs.BOM_UTF32_LE, "utf-32-le"), (codecs.BOM_UTF32_BE, "utf-32-be"),
+                       (codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be")]
 
-    def __init__(self):
+    def __init__(self, quiet=False, lineCache=None):
         self._previousLineString = None
         self._previousLineType = None
         self._writeError = True
+        # when quiet, error messages are only recorded in self.diagnostics
+        self._quiet = quiet
+        # parsed import lines, can be shared by the checkers of a batch run
+        self._lineCache = ImportLineCache() if lineCache is None else lineCache
+        # statistics about the last file sorted, filled by sortImportGroups()
+        self.stats = {}
+        # error messages printed so far
+        self.diagnostics = []
         self.resetOrder()
 
     def printErrorMsg(self, filename, lineNb, errorMessage):
         ''' I print the error message following pylint convention'''
         if self._writeError:
-            print ("%(filename)s:%(line_nb)s: %(error_msg)s" %
-                   dict(filename=filename,
-                        line_nb=lineNb,
-                        error_msg=errorMessage))
+            message = ("%(filename)s:%(line_nb)s: %(error_msg)s" %
+                       dict(filename=filename,
+                            line_nb=lineNb,
+                            error_msg=errorMessage))
+            self.diagnostics.append(message)
+            if not self._quiet:
+                print message
 
     def isImportLine(self, line):
         '''I return True is the given line is an import statement, False otherwize'''
@@ -39,29 +75,36 @@ class CheckImports(object):
             return True
         return False
 
-    def analyzeLine(self, filename, line, lineNb):
-        '''I look at the line and print all error I find'''
+    def lineErrors(self, line):
+        '''
+        I return a (res, errors) tuple for the given line, where res is False if the line is an
+        import line I cannot accept as is, and errors the list of error messages
+        '''
         res = True
+        errors = []
         if self.isImportLine(line):
             if ';' in line:
-                self.printErrorMsg(filename, lineNb,
-                                   "multiple import statement on one line. "
-                                   "Put each import on its own line.")
+                errors.append("multiple import statement on one line. "
+                              "Put each import on its own line.")
                 res = False
             if ',' in line:
-                self.printErrorMsg(filename, lineNb,
-                                   "multiple module imported on one line. "
-                                   "Please import each module on a single line.")
+                errors.append("multiple module imported on one line. "
+                              "Please import each module on a single line.")
                 res = False
             if '\\' in line:
-                self.printErrorMsg(filename, lineNb,
-                                   "new line character found. "
-                                   "Please import each module on a single line")
+                errors.append("new line character found. "
+                              "Please import each module on a single line")
             if '(' in line:
-                self.printErrorMsg(filename, lineNb,
-                                   "parenthesis character found. "
-                                   "Please import each module on a single line")
+                errors.append("parenthesis character found. "
+                              "Please import each module on a single line")
                 res = False
+        return res, errors
+
+    def analyzeLine(self, filename, line, lineNb):
+        '''I look at the line and print all error I find'''
+        res, errors = self.lineErrors(line)
+        for error in errors:
+            self.printErrorMsg(filename, lineNb, error)
         return res
 
     def resetOrder(self):
@@ -138,18 +181,108 @@ class CheckImports(object):
         else:
             return 0
 
+    def _scanImportLines(self, data):
+        '''
+        I scan the whole buffer at once and yield a (lineNb, start, end, reset) tuple for each
+        import line, where start and end are the offsets of the line in data. 'reset' is True when
+        a blank or comment-only line lies between this import line and the previous one, ie, when
+        the order check has to be reset before checking this line.
+
+        Note: lines that are neither import lines nor separators do not alter the order check, so
+        they never need to reach the per-line methods.
+        '''
+        line_nb = 0
+        counted_pos = 0
+        previous_end = None
+        matches = self._regexImportLine.finditer(data)
+        if isinstance(data, str) and data.startswith(codecs.BOM_UTF8):
+            # '^' never matches right after the byte order mark, the first line is matched apart
+            first_match = self._regexImportLineAfterBOM.match(data, len(codecs.BOM_UTF8))
+            if first_match is not None:
+                matches = itertools.chain([first_match], matches)
+        for match in matches:
+            start = match.start()
+            line_nb += data.count("\n", counted_pos, start)
+            counted_pos = start
+            reset = False
+            if previous_end is not None and previous_end + 1 < start:
+                # 'previous_end' is the position of the line feed ending the previous import line
+                # and 'start - 1' the one ending the line just before the current one
+                reset = self._regexGroupSeparator.search(data, previous_end + 1,
+                                                         start - 1) is not None
+            previous_end = match.end()
+            yield line_nb, start, previous_end, reset
+
+    def iterImportLines(self, data):
+        '''I yield a (lineNb, line, reset) tuple for each import line of data'''
+        for line_nb, start, end, reset in self._scanImportLines(data):
+            yield line_nb, data[start:end], reset
+
+    def indexImportLines(self, data):
+        '''I return the ImportLineIndex of data'''
+        return ImportLineIndex(data, self._scanImportLines(data))
+
+    def parseImportLine(self, line):
+        '''I return the ImportLine record holding all I need to know about the given line'''
+        valid, errors = self.lineErrors(line)
+        order_line = line.partition("#")[0].rstrip()
+        order_type = None
+        if self._regexImport.match(order_line):
+            order_type = "import"
+        elif self._regexFromImport.match(order_line):
+            order_type = "from"
+        sort_keys = tuple(self.importLineSortKey(splitted_line)
+                          for splitted_line in self.splitImportLine(line))
+        return ImportLine(valid, tuple(errors), self.isBadLineFixable(line), order_line,
+                          order_type, sort_keys)
+
+    def parsedLine(self, line):
+        '''I return the ImportLine record of the given line, parsed only once per batch run'''
+        return self._lineCache.get(line, self.parseImportLine)
+
+    def checkParsedLine(self, filename, parsedLine, lineNb):
+        '''
+        I do what analyzeLine() then checkOrder() do, from the ImportLine record of the line
+        only, and return both results
+        '''
+        for error in parsedLine.errors:
+            self.printErrorMsg(filename, lineNb, error)
+        if not parsedLine.orderLine:
+            # changing group => reseting groups
+            self.resetOrder()
+            return parsedLine.valid, True
+
+        if ((self._previousLineType == "import" and parsedLine.orderType == "from") or
+                (self._previousLineType == "from" and parsedLine.orderType == "import")):
+            self.printErrorMsg(filename, lineNb,
+                               "Warning: mixing of 'import ...' and 'from ... import ...' "
+                               "statements in the same group")
+
+        if parsedLine.orderType is None:
+            return parsedLine.valid, True
+
+        if not self._previousLineString:
+            self._previousLineString = parsedLine.orderLine
+            self._previousLineType = parsedLine.orderType
+            return parsedLine.valid, True
+        previous_key = (self._previousLineType != "import", self._previousLineString)
+        self._previousLineString = parsedLine.orderLine
+        self._previousLineType = parsedLine.orderType
+        if previous_key > parsedLine.orderKey:
+            self.printErrorMsg(filename, lineNb,
+                               "Bad order for this import")
+            return parsedLine.valid, False
+        return parsedLine.valid, True
+
     def checkData(self, filename, data):
         '''I perform an analysis of the files and print the error, without modifying the content'''
         res = True
         self.resetOrder()
-        lines = data.split("\n")
-        for cur_line_nb, line in enumerate(lines):
-            if not self.analyzeLine(filename, line, cur_line_nb):
-                res = False
-            try:
-                if not self.checkOrder(filename, line, cur_line_nb):
-                    res = False
-            except Exception:
+        for cur_line_nb, line, reset in self.iterImportLines(data):
+            if reset:
+                self.resetOrder()
+            valid, ordered = self.checkParsedLine(filename, self.parsedLine(line), cur_line_nb)
+            if not valid or not ordered:
                 res = False
         return res
 
@@ -158,19 +291,58 @@ class CheckImports(object):
         I perform the analysis of the given file, print the error I find and try to split and
         sort the import statement
         '''
-        lines = data.split("\n")
+        res, changes = self.sortedGroupChanges(filename, data)
+        if not res:
+            return False, data
+        if not changes:
+            return True, data
+
+        # Only the import groups are rebuilt, the rest of the file is copied by slicing the
+        # original buffer
+        chunks = []
+        copied_pos = 0
+        for _, start, end, sorted_group in changes:
+            chunks.append(data[copied_pos:start])
+            chunks.append(sorted_group)
+            copied_pos = end
+        chunks.append(data[copied_pos:])
+        return True, "".join(chunks)
+
+    def diffImportGroups(self, filename, data, context=3):
+        '''
+        I perform the analysis of the given file, print the error I find and return a (res, diff)
+        tuple, where diff is the unified diff of the changes sortImportGroups() would make
+        '''
+        res, changes = self.sortedGroupChanges(filename, data)
+        if not res:
+            return False, ""
+        return True, unifiedImportDiff(filename, data, changes, context)
+
+    def sortedGroupChanges(self, filename, data):
+        '''
+        I perform the analysis of the given file, print the error I find and return a (res,
+        changes) tuple. changes lists the import groups which are not sorted, as (lineNb, start,
+        end, sortedGroup) tuples, where lineNb is the number of the first line of the group, start
+        and end its offsets in data and sortedGroup its sorted content
+        '''
+        index = self.indexImportLines(data)
+        line_count = data.count("\n")
+        if data and not data.endswith("\n"):
+            line_count += 1
+        group_sizes = [last - first for first, last in index.groups()]
+        self.stats = dict(lines=line_count, imports=len(index),
+                          largest_group=max(group_sizes or [0]))
         res = True
         self.resetOrder()
-        for cur_line_nb, line in enumerate(lines):
-            if not self.analyzeLine(filename, line, cur_line_nb):
-                if not self.isBadLineFixable(line):
-                    res = False
-            try:
-                self.checkOrder(filename, line, cur_line_nb)
-            except Exception:
+        for i in range(len(index)):
+            parsed_line = self.parsedLine(index.line(i))
+            if index.resets[i]:
+                self.resetOrder()
+            valid, _ = self.checkParsedLine(filename, parsed_line, index.lineNbs[i])
+            if not valid and not parsed_line.fixable:
                 res = False
         if not res:
-            return False, data
+            return False, []
 
         # Check procedure is performed twice:
         # - the first time to check if no exception (= major error) does not
@@ -181,93 +353,1010 @@ class CheckImports(object):
         self._writeError = False
         self.resetOrder()
 
-        # First split the import we can split
-        newlines = []
-        for line in lines:
-            if self.isImportLine(line) and self.isBadLineFixable(line):
-                match = self._regexFromImport.match(line)
-                if match:
-                    module = match.group(1)
-                    imports = [s.strip() for s in match.group(2).split(",")]
-                    for imp in imports:
-                        newlines.append("from %s import %s" % (module, imp))
-                    continue
-            newlines.append(line)
-
-        lines = newlines
-
-        sorted_data = []
-        current_group_start_line_nb = -1
-        for cur_line_nb, line in enumerate(lines):
-            if not line.strip() or not self.isImportLine(line):
-                current_group_start_line_nb = -1
-                sorted_data.append(line)
-                self.resetOrder()
+        changes = []
+        # Lines are split on line feeds only, so the carriage returns of a CRLF file are put back
+        # on every line of the sorted groups, including the splitted and blank ones
+        first_line_feed = data.find("\n")
+        crlf = first_line_feed > 0 and data[first_line_feed - 1] == "\r"
+        for first, last in index.groups():
+            start = index.starts[first]
+            end = index.ends[last - 1]
+            group = data[start:end]
+            if crlf:
+                lines = [line[:-1] if line.endswith("\r") else line for line in group.split("\n")]
+                sorted_group = "\r\n".join(self.sortGroup(lines))
+                if group.endswith("\r"):
+                    sorted_group += "\r"
             else:
-                if current_group_start_line_nb == -1:
-                    current_group_start_line_nb = cur_line_nb
-                    sorted_data.append(line)
+                sorted_group = "\n".join(self.sortGroup(group.split("\n")))
+            if sorted_group != group:
+                changes.append((index.lineNbs[first], start, end, sorted_group))
+        return True, changes
+
+    def sourceEncoding(self, data):
+        '''
+        I return the encoding declared by the byte order mark or the PEP 263 coding cookie of the
+        raw content of a python file, or None if there is none
+        '''
+        for bom, encoding in self._byteOrderMarks:
+            if data.startswith(bom):
+                return encoding
+        if data.startswith(codecs.BOM_UTF8):
+            return "utf-8"
+        second_line_end = data.find("\n", data.find("\n") + 1)
+        if second_line_end == -1:
+            second_line_end = len(data)
+        for line in data[:second_line_end].split("\n"):
+            match = self._regexCodingCookie.match(line)
+            if match:
+                return match.group(1)
+        return None
+
+    def byteOrderMark(self, data):
+        '''I return the UTF-16 or UTF-32 byte order mark starting data, or an empty string'''
+        for bom, _ in self._byteOrderMarks:
+            if data.startswith(bom):
+                return bom
+        return ""
+
+    def decodeSource(self, filename, data, encoding):
+        '''
+        I return the raw content of a python file decoded from the given encoding, without its
+        byte order mark, or None, after printing the error, if it cannot be decoded
+        '''
+        try:
+            return data[len(self.byteOrderMark(data)):].decode(encoding)
+        except UnicodeError as e:
+            self.printErrorMsg(filename, 1, "Cannot decode file as %s: %s" % (encoding, e))
+            return None
+
+    def isAsciiCompatible(self, encoding):
+        '''
+        I return True if import statements encoded with the given encoding are plain ASCII bytes,
+        ie, if the raw content can be processed without being decoded
+        '''
+        if encoding is None:
+            return True
+        try:
+            return u"from . import _\r\n".encode(encoding) == "from . import _\r\n"
+        except (LookupError, UnicodeError):
+            # an unknown encoding is refused by python itself, import names are processed as is
+            return True
+
+    def sortSource(self, filename, data):
+        '''
+        I sort the import statements of the raw content of a python file. The content is only
+        decoded when its encoding is not a superset of ASCII, otherwise bytes are processed
+        directly and all the lines out of the import groups are left untouched.
+        '''
+        encoding = self.sourceEncoding(data)
+        if self.isAsciiCompatible(encoding):
+            return self.sortImportGroups(filename, data)
+        text = self.decodeSource(filename, data, encoding)
+        if text is None:
+            return False, data
+        res, content = self.sortImportGroups(filename, text)
+        if not res or content == text:
+            return res, data
+        return res, self.byteOrderMark(data) + content.encode(encoding)
+
+    def diffSource(self, filename, data, context=3):
+        '''
+        I return the unified diff of the changes sortSource() would make to the raw content of a
+        python file. A decoded content gives an UTF-8 encoded diff
+        '''
+        encoding = self.sourceEncoding(data)
+        if self.isAsciiCompatible(encoding):
+            return self.diffImportGroups(filename, data, context)
+        text = self.decodeSource(filename, data, encoding)
+        if text is None:
+            return False, ""
+        res, changes = self.sortedGroupChanges(filename, text)
+        if not res or not changes:
+            return res, ""
+        # only the decoded text is encoded, the file name is already a byte string
+        return res, (unifiedDiffHeader(filename) +
+                     unifiedImportHunks(text, changes, context).encode("utf-8"))
+
+    def splitImportLine(self, line):
+        '''I return the list of lines to use in place of the given import line'''
+        if self.isBadLineFixable(line):
+            match = self._regexFromImport.match(line)
+            if match:
+                module = match.group(1)
+                return ["from %s import %s" % (module, imp.strip())
+                        for imp in match.group(2).split(",")]
+        return [line]
+
+    def importLineSortKey(self, line):
+        '''
+        I return the key sorting import lines the way compareImportLines() does: 'import' lines
+        first, then 'from' lines, each alphabetically
+        '''
+        return (self._regexImport.match(line) is None, line)
+
+    def sortGroup(self, lines):
+        '''
+        I split, sort and return the given group of consecutive import lines. An empty line is
+        inserted between 'import' and 'from' lines
+        '''
+        keys = sorted(key for line in lines for key in self.parsedLine(line).sortKeys)
+        sorted_lines = []
+        for i, (is_from, line) in enumerate(keys):
+            if i and is_from and not keys[i - 1][0]:
+                sorted_lines.append("")
+            sorted_lines.append(line)
+        return sorted_lines
+
+
+def _linesBefore(data, pos, count):
+    '''I return the (at most) count lines before the line starting at pos'''
+    lines = []
+    while pos > 0 and len(lines) < count:
+        start = data.rfind("\n", 0, pos - 1) + 1
+        lines.append(data[start:pos - 1])
+        pos = start
+    lines.reverse()
+    return lines
+
+
+def _linesAfter(data, pos, count):
+    '''I return the (at most) count lines after the line ending at pos'''
+    lines = []
+    while pos < len(data) - 1 and len(lines) < count:
+        end = data.find("\n", pos + 1)
+        if end == -1:
+            end = len(data)
+        lines.append(data[pos + 1:end])
+        pos = end
+    return lines
+
+
+def _hunkRange(start, count):
+    '''I return the range of a unified diff hunk, in the format of difflib and GNU diff'''
+    if count == 1:
+        return "%d" % (start)
+    return "%d,%d" % (start, count)
+
+
+def unifiedDiffHeader(filename):
+    '''I return the header lines of the unified diff of the given file'''
+    return "--- a/%s\n+++ b/%s\n" % (filename, filename)
+
+
+def unifiedImportDiff(filename, data, changes, context=3):
+    '''
+    I return the unified diff between data and data with the given import group changes (see
+    CheckImports.sortedGroupChanges) applied. Only the changed groups and their context lines are
+    split into lines, never the whole file
+    '''
+    if not changes:
+        return ""
+    return unifiedDiffHeader(filename) + unifiedImportHunks(data, changes, context)
+
+
+def unifiedImportHunks(data, changes, context=3):
+    '''I return the hunks of the diff built by unifiedImportDiff(), without its header lines'''
+    no_newline = "\\ No newline at end of file\n"
+    missing_newline = not data.endswith("\n")
+    diff = []
+    if (isinstance(data, str) and data.startswith(codecs.BOM_UTF8) and
+            changes[0][1] == len(codecs.BOM_UTF8)):
+        # a group on the first line starts after the UTF-8 BOM, which belongs to its line
+        line_nb, _, end, sorted_group = changes[0]
+        changes = [(line_nb, 0, end, codecs.BOM_UTF8 + sorted_group)] + changes[1:]
+
+    # changes separated by less than twice the context share the same hunk
+    hunks = [[changes[0]]]
+    for change in changes[1:]:
+        line_nb, start, end, _ = hunks[-1][-1]
+        if change[0] - (line_nb + data.count("\n", start, end) + 1) <= 2 * context:
+            hunks[-1].append(change)
+        else:
+            hunks.append([change])
+
+    offset = 0
+    for hunk in hunks:
+        before = _linesBefore(data, hunk[0][1], context)
+        lines = [" " + line + "\n" for line in before]
+        old_count = new_count = len(before)
+        previous_end = None
+        for _, start, end, sorted_group in hunk:
+            if previous_end is not None:
+                between = data[previous_end + 1:start - 1].split("\n")
+                lines.extend(" " + line + "\n" for line in between)
+                old_count += len(between)
+                new_count += len(between)
+            old_lines = data[start:end].split("\n")
+            new_lines = sorted_group.split("\n")
+            lines.extend("-" + line + "\n" for line in old_lines)
+            if end == len(data) and missing_newline:
+                lines.append(no_newline)
+            lines.extend("+" + line + "\n" for line in new_lines)
+            if end == len(data) and missing_newline:
+                lines.append(no_newline)
+            old_count += len(old_lines)
+            new_count += len(new_lines)
+            previous_end = end
+        after = _linesAfter(data, previous_end, context)
+        lines.extend(" " + line + "\n" for line in after)
+        if after and missing_newline and \
+                previous_end + len(after) + sum(map(len, after)) == len(data):
+            lines.append(no_newline)
+        old_count += len(after)
+        new_count += len(after)
+        old_start = hunk[0][0] + 1 - len(before)
+        diff.append("@@ -%s +%s @@\n" % (_hunkRange(old_start, old_count),
+                                         _hunkRange(old_start + offset, new_count)))
+        diff.extend(lines)
+        offset += new_count - old_count
+    return "".join(diff)
+
+
+class ImportLine(object):
+
+    '''
+    I am the parsed form of an import line: the errors to report, what checkOrder() compares and
+    the sort keys of the lines it is splitted into
+    '''
+
+    __slots__ = ("valid", "errors", "fixable", "orderLine", "orderType", "orderKey", "sortKeys")
+
+    def __init__(self, valid, errors, fixable, orderLine, orderType, sortKeys):
+        self.valid = valid
+        self.errors = errors
+        self.fixable = fixable
+        self.orderLine = orderLine
+        self.orderType = orderType
+        self.orderKey = (orderType != "import", orderLine)
+        self.sortKeys = sortKeys
+
+
+class ImportLineCache(object):
+
+    '''
+    I intern the ImportLine records by line text, so a line repeated across all the files of a
+    batch run is parsed once and then costs a single dictionary lookup.
+
+    My size is bounded with an approximated LRU eviction: records are kept in two generations of
+    maxSize / 2 lines. When the recent generation is full, the older one is dropped and the recent
+    one becomes the older one. A line found in the older generation is moved to the recent one.
+    '''
+
+    def __init__(self, maxSize=65536):
+        self._generationSize = max(maxSize // 2, 1)
+        self._recent = {}
+        self._older = {}
+
+    def __len__(self):
+        return len(self._recent) + len(self._older)
+
+    def get(self, line, parse):
+        '''I return the record of the given line, calling parse(line) if I do not have it'''
+        # u"import os" == "import os": the lines of decoded sources, whose records hold unicode
+        # sort keys, must not be mixed up with the byte string ones
+        key = line if line.__class__ is str else (line.__class__, line)
+        record = self._recent.get(key)
+        if record is None:
+            record = self._older.pop(key, None)
+            if record is None:
+                record = parse(line)
+            if len(self._recent) >= self._generationSize:
+                self._older = self._recent
+                self._recent = {}
+            self._recent[key] = record
+        return record
+
+
+class ImportLineIndex(object):
+
+    '''
+    I index the import lines of a buffer by their offsets, so very large files are never split
+    into one string per line: only the import lines are materialized, on demand.
+    '''
+
+    def __init__(self, data, scannedLines):
+        self.data = data
+        self.lineNbs = array("l")
+        self.starts = array("l")
+        self.ends = array("l")
+        self.resets = array("b")
+        for line_nb, start, end, reset in scannedLines:
+            self.lineNbs.append(line_nb)
+            self.starts.append(start)
+            self.ends.append(end)
+            self.resets.append(reset)
+
+    def __len__(self):
+        return len(self.lineNbs)
+
+    def line(self, i):
+        '''I return the i-th import line'''
+        return self.data[self.starts[i]:self.ends[i]]
+
+    def groups(self):
+        '''I yield the (first, last) index range of each group of consecutive import lines'''
+        first = 0
+        for i in range(1, len(self.lineNbs) + 1):
+            if i == len(self.lineNbs) or self.lineNbs[i] != self.lineNbs[i - 1] + 1:
+                yield first, i
+                first = i
+
+
+class GitBlobReader(object):
+
+    '''
+    I read blob contents through a single long-lived 'git cat-file --batch' process, so thousands
+    of files are read through one pipe instead of being opened one by one
+    '''
+
+    def __init__(self, cwd=None):
+        import subprocess
+        self._process = subprocess.Popen(["git", "cat-file", "--batch"], cwd=cwd,
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, sha):
+        '''I return the content of the given blob'''
+        self._process.stdin.write(sha + "\n")
+        self._process.stdin.flush()
+        header = self._process.stdout.readline().split()
+        if len(header) != 3 or header[1] != "blob":
+            raise ValueError("cannot read blob %s from git: %s" % (sha, " ".join(header)))
+        content = self._process.stdout.read(int(header[2]))
+        # the content is followed by a line feed
+        self._process.stdout.read(1)
+        return content
+
+    def close(self):
+        '''I stop the git process'''
+        self._process.stdin.close()
+        self._process.wait()
+
+
+def listStagedFiles(cwd=None):
+    '''
+    I return the (mode, sha, path) of the python files added or modified in the git index. Paths
+    are relative to the top of the working tree
+    '''
+    import subprocess
+    # full shas, an abbreviated one may be ambiguous for git cat-file
+    output = subprocess.check_output(["git", "diff", "--cached", "--raw", "-z", "--no-abbrev",
+                                      "--no-renames", "--diff-filter=ACM"], cwd=cwd)
+    fields = output.split("\0")
+    staged = []
+    for meta, path in zip(fields[0::2], fields[1::2]):
+        _, mode, _, sha, _ = meta.split(" ")
+        if path.endswith(".py") and mode != "160000":
+            staged.append((mode, sha, path))
+    return staged
+
+
+def writeBlobs(contents, cwd=None):
+    '''
+    I write the given contents as blobs in the git object database, all through a single 'git
+    hash-object' process, and return their shas
+    '''
+    import shutil
+    import subprocess
+    import tempfile
+    directory = tempfile.mkdtemp()
+    try:
+        paths = []
+        for i, content in enumerate(contents):
+            paths.append(os.path.join(directory, "%d.py" % (i)))
+            with open(paths[-1], 'wb') as filedesc:
+                filedesc.write(content)
+        hasher = subprocess.Popen(["git", "hash-object", "-w", "--no-filters", "--stdin-paths"],
+                                  cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        shas = hasher.communicate("".join(path + "\n" for path in paths))[0].split()
+    finally:
+        shutil.rmtree(directory)
+    if hasher.returncode != 0 or len(shas) != len(contents):
+        raise subprocess.CalledProcessError(hasher.returncode, "git hash-object")
+    return shas
+
+
+def checkStagedFiles(fix=False, cwd=None, report=None, limits=None):
+    '''
+    I check the python files staged in the git index, ie, what is actually being committed
+    rather than the working tree. If fix is True, the sorted files are written back to the index
+    and, when it has no unstaged change, to the working tree. I return False if a file cannot be
+    sorted or, without fix, if a file is not sorted. The statistics of each file are recorded in
+    the given BatchReport, files exceeding the given FileLimits are skipped or only checked
+    '''
+    import subprocess
+    toplevel = subprocess.check_output(["git", "rev-parse", "--show-toplevel"],
+                                       cwd=cwd).rstrip("\n")
+    staged = listStagedFiles(toplevel)
+    res = True
+    # (mode, path, staged content, sorted content) of the files to write back
+    fixed = []
+    line_cache = ImportLineCache()
+    reader = GitBlobReader(toplevel)
+    try:
+        for mode, sha, path in staged:
+            start = time.time()
+            data = reader.read(sha)
+            checker, file_res, content, skipped = sortData(path, data, limits,
+                                                           lineCache=line_cache)
+            if skipped:
+                print "%s: %s" % (skipped, path)
+            if file_res and data != content and not fix:
+                print "imports not sorted in staged file: %s" % (path)
+                file_res = False
+            if report is not None:
+                report.record(path, time.time() - start, checker.stats, file_res,
+                              checker.diagnostics, skipped)
+            if not file_res:
+                res = False
+                continue
+            if data != content:
+                fixed.append((mode, path, data, content))
+    finally:
+        reader.close()
+    if not fixed:
+        return res
+
+    shas = writeBlobs([sorted_content for _, _, _, sorted_content in fixed], toplevel)
+    updater = subprocess.Popen(["git", "update-index", "--index-info"], cwd=toplevel,
+                               stdin=subprocess.PIPE)
+    updater.communicate("".join("%s %s\t%s\n" % (mode, sha, path)
+                                for (mode, path, _, _), sha in zip(fixed, shas)))
+    if updater.returncode != 0:
+        return False
+    for _, path, data, content in fixed:
+        filename = os.path.join(toplevel, path)
+        try:
+            with open(filename, 'rb') as filedesc:
+                unstaged_changes = filedesc.read() != data
+        except EnvironmentError:
+            # deleted or moved in the working tree
+            unstaged_changes = True
+        if unstaged_changes:
+            print "import reordered in the index only, unstaged changes: %s" % (path)
+        else:
+            with open(filename, 'wb') as filedesc:
+                filedesc.write(content)
+            print "import successfully reordered for file: %s" % (path)
+    return res
+
+
+class FileTimeout(Exception):
+
+    '''I am raised when a file takes more than the allowed time to be processed'''
+
+
+class FileLimits(object):
+
+    '''
+    I hold the per-file limits of a batch run, so a single giant or pathological file cannot
+    stall it. A file exceeding a limit is skipped, or only checked (which is linear and never
+    rewrites the file) when oversized is "check"
+    '''
+
+    def __init__(self, maxBytes=None, maxLines=None, timeout=None, oversized="skip"):
+        self.maxBytes = maxBytes
+        self.maxLines = maxLines
+        self.timeout = timeout
+        self.oversized = oversized
+
+    def exceeded(self, data):
+        '''I return which size limit data exceeds, or None'''
+        if self.maxBytes is not None and len(data) > self.maxBytes:
+            return "more than %d bytes" % (self.maxBytes)
+        if self.maxLines is not None:
+            line_count = data.count("\n")
+            if data and not data.endswith("\n"):
+                line_count += 1
+            if line_count > self.maxLines:
+                return "more than %d lines" % (self.maxLines)
+        return None
+
+    @contextmanager
+    def deadline(self):
+        '''I raise FileTimeout in the managed block if it lasts more than timeout seconds'''
+        if not self.timeout:
+            yield
+            return
+        import signal
+
+        def onAlarm(signum, frame):
+            '''I interrupt the file processing'''
+            raise FileTimeout()
+
+        previous_handler = signal.signal(signal.SIGALRM, onAlarm)
+        signal.setitimer(signal.ITIMER_REAL, self.timeout)
+        try:
+            yield
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+
+def sortData(filename, data, limits=None, quiet=False, lineCache=None, diff=None):
+    '''
+    I sort the raw content of a file within the given FileLimits and return a (checker, res,
+    content, skipped) tuple. skipped is None if the file was sorted, or tells why it was skipped or
+    only checked. In this case content is data.
+
+    If diff is not None, content is the unified diff of the sort instead, with diff lines of
+    context. It is empty if the file is already sorted, skipped or only checked.
+    '''
+    limits = limits or FileLimits()
+    checker = CheckImports(quiet=quiet, lineCache=lineCache)
+    reason = limits.exceeded(data)
+    unchanged = data if diff is None else ""
+    if reason is None:
+        try:
+            with limits.deadline():
+                if diff is None:
+                    res, content = checker.sortSource(filename, data)
                 else:
-                    comp = -1
-                    if sorted_data:
-                        comp = self.compareImportLines(sorted_data[-1], line)
-                    if comp > 0:
-                        i = len(sorted_data) - 1
-                        while (i >= 0 and
-                               i > current_group_start_line_nb):
-                            i -= 1
-                            if self.compareImportLines(sorted_data[i], line) < 0:
-                                i += 1
-                                break
-                        sorted_data.insert(i, line)
-                    else:
-                        sorted_data.append(line)
-
-        # reiterate line by line to split mixed groups
-        splitted_groups_lines = []
-        prev_import_line_type = ""
-        for line in sorted_data:
-            if not line.strip() or not self.isImportLine(line):
-                splitted_groups_lines.append(line)
-                prev_import_line_type = ""
+                    res, content = checker.diffSource(filename, data, diff)
+            return checker, res, content, None
+        except FileTimeout:
+            reason = "more than %ss to sort" % (limits.timeout)
+            checker = CheckImports(quiet=quiet, lineCache=lineCache)
+    if limits.oversized != "check":
+        return checker, True, unchanged, "skipped, %s" % (reason)
+    try:
+        with limits.deadline():
+            res = checker.checkData(filename, data)
+    except FileTimeout:
+        return CheckImports(quiet=quiet), True, unchanged, "skipped, %s and to check" % (reason)
+    return checker, res, unchanged, "only checked, %s" % (reason)
+
+
+def processFile(filename, limits=None, quiet=False, lineCache=None, diff=None):
+    '''
+    I sort the import statements of the given file in place, within the given FileLimits, and
+    return its BatchReport entry along with the messages to print. If diff is not None, the file
+    is left untouched and the messages hold its unified diff, with diff lines of context
+    '''
+    limits = limits or FileLimits()
+    start = time.time()
+    messages = []
+    checker = CheckImports(quiet=quiet)
+    res = True
+    skipped = None
+    try:
+        if (limits.maxBytes is not None and limits.oversized != "check" and
+                os.path.getsize(filename) > limits.maxBytes):
+            # not even read
+            skipped = "skipped, more than %d bytes" % (limits.maxBytes)
+        else:
+            with open(filename, 'rb') as filedesc:
+                data = filedesc.read()
+            checker, res, content, skipped = sortData(filename, data, limits, quiet, lineCache,
+                                                      diff)
+            if diff is not None:
+                if content:
+                    messages.append(content.rstrip("\n"))
+            elif res and data != content:
+                with open(filename, 'wb') as filedesc:
+                    filedesc.write(content)
+                messages.append("import successfully reordered for file: %s" % (filename))
+    except EnvironmentError as e:
+        res = False
+        messages.append("cannot process file %s: %s" % (filename, e))
+    if skipped:
+        messages.append("%s: %s" % (skipped, filename))
+    entry = BatchReport.entry(filename, time.time() - start, checker.stats, res,
+                              checker.diagnostics, skipped)
+    return entry, messages
+
+
+def sortFile(filename, report=None, limits=None, lineCache=None, diff=None):
+    '''
+    I sort the import statements of the given file in place, or print their unified diff if diff
+    is not None. I return False on error. The statistics of the file are recorded in the given
+    BatchReport
+    '''
+    entry, messages = processFile(filename, limits, lineCache=lineCache, diff=diff)
+    for message in messages:
+        print message
+    if report is not None:
+        report.files.append(entry)
+    return entry["status"]
+
+
+# seconds without any file completed after which the workers of a parallel run without timeout
+# are considered hung
+DEFAULT_HANG_TIMEOUT = 60
+
+# parsed import lines shared by the files processed by a worker process
+_workerLineCache = None
+# queue of the files started by the worker processes, so the parent process knows which ones hung
+_workerStarted = None
+
+
+def _initWorker(started):
+    '''I initialize a worker process with the queue of the started files'''
+    global _workerStarted
+    _workerStarted = started
+
+
+def _processFileQuietly(filename, limits, diff):
+    '''I process a file in a worker process, the messages are printed by the parent process'''
+    global _workerLineCache
+    if _workerLineCache is None:
+        _workerLineCache = ImportLineCache()
+    if _workerStarted is not None:
+        _workerStarted.put(filename)
+    return processFile(filename, limits, quiet=True, lineCache=_workerLineCache, diff=diff)
+
+
+def _processFilesInPool(filenames, entries, limits, jobs, diff, hangTimeout):
+    '''
+    I process the given files in a pool of jobs worker processes and record their entries in the
+    entries dictionary. If no file completes during hangTimeout seconds, I kill the workers and
+    return the files they were processing, the files they did not start are left unprocessed
+    '''
+    import multiprocessing
+    import Queue
+    started_queue = multiprocessing.Queue()
+    started = set()
+    pool = multiprocessing.Pool(jobs, _initWorker, (started_queue,))
+    try:
+        pending = [(filename, pool.apply_async(_processFileQuietly, (filename, limits, diff)))
+                   for filename in filenames]
+        last_progress = time.time()
+        while pending:
+            ready = [(filename, result) for filename, result in pending if result.ready()]
+            for filename, result in ready:
+                try:
+                    entry, messages = result.get()
+                except Exception as e:
+                    # raised by the worker: any other error than EnvironmentError
+                    entry = BatchReport.entry(filename, 0, {}, False)
+                    messages = ["cannot process file %s: %s: %s" % (filename,
+                                                                    e.__class__.__name__, e)]
+                for message in entry["diagnostics"] + messages:
+                    print message
+                entries[filename] = entry
+            if ready:
+                pending = [item for item in pending if item[0] not in entries]
+                last_progress = time.time()
+            elif time.time() - last_progress > hangTimeout:
+                break
             else:
-                import_match = self._regexImport.match(line)
-                from_match = self._regexFromImport.match(line)
-                current_line_type = None
-                if import_match is not None:
-                    module = import_match
-                    current_line_type = "import"
-                elif from_match is not None:
-                    module = from_match
-                    current_line_type = "from"
-                assert(current_line_type)
-                if prev_import_line_type and current_line_type != prev_import_line_type:
-                    splitted_groups_lines.append("")
-                prev_import_line_type = current_line_type
-                splitted_groups_lines.append(line)
-
-        return True, "\n".join(splitted_groups_lines)
-
-
-def main():
-    '''I am the main method'''
-    if len(sys.argv) != 2:
-        print "usage: %s <python file>" % (sys.argv[0])
-        sys.exit(1)
+                time.sleep(0.01)
+    finally:
+        pool.terminate()
+    while True:
+        try:
+            started.add(started_queue.get_nowait())
+        except Queue.Empty:
+            break
+    unfinished = [filename for filename in filenames if filename not in entries]
+    # without any started file identified, all of them are considered hung so I always progress
+    return [filename for filename in unfinished if filename in started] or unfinished
+
+
+def processFiles(filenames, report, limits=None, jobs=1, diff=None):
+    '''
+    I sort the given files, or print their unified diff if diff is not None, in jobs worker
+    processes if jobs > 1, and record them in the given BatchReport. I return False if a file
+    could not be sorted.
 
-    filename = sys.argv[1]
+    The timeout of the limits is enforced inside each worker. If no file at all completes during
+    twice this time plus one second, or DEFAULT_HANG_TIMEOUT seconds without timeout, the
+    remaining workers are considered hung: they are killed, the files they were processing are
+    reported as skipped and the run fails. The files they did not start are processed by new
+    workers. A file crashing its worker fails the run too.
+    '''
+    limits = limits or FileLimits()
+    if jobs <= 1:
+        res = True
+        line_cache = ImportLineCache()
+        for filename in filenames:
+            if not sortFile(filename, report, limits, line_cache, diff):
+                res = False
+        return res
+
+    entries = {}
+    hang_timeout = limits.timeout * 2 + 1 if limits.timeout else DEFAULT_HANG_TIMEOUT
+    remaining = filenames
+    while remaining:
+        for filename in _processFilesInPool(remaining, entries, limits, jobs, diff,
+                                            hang_timeout):
+            print "skipped, worker hung: %s" % (filename)
+            entries[filename] = BatchReport.entry(filename, hang_timeout, {}, False, [],
+                                                  "skipped, worker hung")
+        remaining = [filename for filename in remaining if filename not in entries]
+    for filename in filenames:
+        report.files.append(entries[filename])
+    return all(entries[filename]["status"] for filename in filenames)
+
+
+def discoverFiles(paths):
+    '''
+    I return the sorted list of files to process: the given files and the python files found in
+    the given directories
+    '''
+    filenames = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, files in os.walk(path):
+                filenames.update(os.path.join(dirpath, filename) for filename in files
+                                 if filename.endswith(".py"))
+        else:
+            filenames.add(path)
+    return sorted(filenames)
 
+
+def loadCosts(filename):
+    '''
+    I return the time recorded for each file in a report, or in the last run of a trend file
+    '''
+    import json
     with open(filename, 'r') as filedesc:
-        data = filedesc.read()
-    res, content = CheckImports().sortImportGroups(filename, data)
-    if not res:
-        sys.exit(1)
-
-    with open(filename, 'w') as filedesc:
-        filedesc.write(content)
-    if data != content:
-        print "import successfully reordered for file: %s" % (filename)
-    sys.exit(0)
+        content = json.load(filedesc)
+    if "runs" in content:
+        content = content["runs"][-1] if content["runs"] else {}
+    return dict((entry["filename"], entry["time"]) for entry in content.get("files", []))
+
+
+def shardFiles(filenames, shardIndex, shardCount, costs=None):
+    '''
+    I return the files of the shard number shardIndex (from 1 to shardCount). The partition only
+    depends on the list of files and their cost, so every CI node computes the same one.
+
+    The cost of a file is its recorded time if it is in costs, its size otherwise (converted to
+    a time with the average speed of the files with a recorded time). The files are assigned, the
+    most expensive first, to the least loaded shard.
+    '''
+    costs = costs or {}
+    sizes = {}
+    for filename in filenames:
+        try:
+            sizes[filename] = os.path.getsize(filename)
+        except OSError:
+            sizes[filename] = 0
+    timed = [filename for filename in filenames if filename in costs]
+    timed_size = sum(sizes[filename] for filename in timed)
+    time_per_byte = sum(costs[filename] for filename in timed) / timed_size if timed_size else 1
+
+    def cost(filename):
+        '''I return the estimated cost of a file'''
+        if filename in costs:
+            return costs[filename]
+        return sizes[filename] * time_per_byte
+
+    loads = [0] * shardCount
+    shard = []
+    for filename in sorted(filenames, key=lambda filename: (-cost(filename), filename)):
+        least_loaded = loads.index(min(loads))
+        loads[least_loaded] += cost(filename)
+        if least_loaded == shardIndex - 1:
+            shard.append(filename)
+    return sorted(shard)
+
+
+class BatchReport(object):
+
+    '''
+    I record the wall time, line count, import count and largest import group size of each file
+    processed by a batch run. Reports are written as JSON and successive ones can be appended to a
+    trend file to follow the evolution of each file
+    '''
+
+    def __init__(self, label=None, date=None, files=None, shard=None):
+        self.label = label
+        self.date = time.time() if date is None else date
+        self.files = [] if files is None else files
+        # "index/count" when the run only processed one shard of the files
+        self.shard = shard
+
+    @staticmethod
+    def entry(filename, duration, stats, status=True, diagnostics=(), skipped=None):
+        '''
+        I return the report entry of one file: its statistics, whether it was successfully
+        processed, the errors printed and why it was skipped if it was
+        '''
+        entry = dict(filename=filename, time=duration, status=status,
+                     diagnostics=list(diagnostics))
+        if skipped:
+            entry["skipped"] = skipped
+        entry.update(stats)
+        return entry
+
+    def record(self, filename, duration, stats, status=True, diagnostics=(), skipped=None):
+        '''I record the statistics of one file'''
+        self.files.append(self.entry(filename, duration, stats, status, diagnostics, skipped))
+
+    def status(self):
+        '''I return False if a file of the report was not successfully processed'''
+        return all(entry.get("status", True) for entry in self.files)
+
+    def slowest(self, count):
+        '''I return the entries of the count slowest files, the slowest first'''
+        return sorted(self.files, key=lambda entry: (-entry["time"], entry["filename"]))[:count]
+
+    def printSummary(self, count):
+        '''I print the count slowest files'''
+        print "======== %d slowest files out of %d (%.3fs in total) ========" % (
+            min(count, len(self.files)), len(self.files),
+            sum(entry["time"] for entry in self.files))
+        for entry in self.slowest(count):
+            print "%8.3fs %8s lines %6s imports %5s in largest group  %s" % (
+                entry["time"], entry.get("lines", "-"), entry.get("imports", "-"),
+                entry.get("largest_group", "-"), entry["filename"])
+
+    def toDict(self):
+        '''I return the JSON serializable content of the report'''
+        return dict(label=self.label, date=self.date, files=self.files, shard=self.shard,
+                    status=self.status())
+
+    @classmethod
+    def fromDict(cls, content):
+        '''I return the report stored in the given dictionary'''
+        return cls(content.get("label"), content.get("date"), content.get("files"),
+                   content.get("shard"))
+
+    def write(self, filename):
+        '''I write the report as JSON in the given file'''
+        import json
+        with open(filename, 'w') as filedesc:
+            json.dump(self.toDict(), filedesc, indent=1, sort_keys=True)
+
+    @classmethod
+    def read(cls, filename):
+        '''I read a report written by write()'''
+        import json
+        with open(filename, 'r') as filedesc:
+            return cls.fromDict(json.load(filedesc))
+
+    @classmethod
+    def merge(cls, reports, label=None):
+        '''I combine several reports of the same run, eg, one per shard, into a single one'''
+        files = []
+        for report in reports:
+            files.extend(report.files)
+        if label is None and reports:
+            label = reports[0].label
+        return cls(label, min([report.date for report in reports] or [None]), files)
+
+
+def appendToTrend(trendFilename, report, maxRuns=None):
+    '''
+    I append the given report to the trend file, keeping at most maxRuns runs, and return the
+    report of the previous run, or None
+    '''
+    import json
+    runs = []
+    if os.path.exists(trendFilename):
+        with open(trendFilename, 'r') as filedesc:
+            runs = json.load(filedesc)["runs"]
+    previous = BatchReport.fromDict(runs[-1]) if runs else None
+    runs.append(report.toDict())
+    if maxRuns:
+        runs = runs[-maxRuns:]
+    with open(trendFilename, 'w') as filedesc:
+        json.dump(dict(runs=runs), filedesc, indent=1, sort_keys=True)
+    return previous
+
+
+def findRegressions(previous, current, factor=2.0, minTime=0.01):
+    '''
+    I return the (filename, previousTime, currentTime) of the files at least factor times slower
+    in the current report than in the previous one. Files faster than minTime are ignored
+    '''
+    previous_times = dict((entry["filename"], entry["time"]) for entry in previous.files)
+    regressions = []
+    for entry in current.files:
+        before = previous_times.get(entry["filename"])
+        if before is not None and entry["time"] >= minTime and entry["time"] >= before * factor:
+            regressions.append((entry["filename"], before, entry["time"]))
+    return sorted(regressions, key=lambda regression: regression[2] / max(regression[1], 1e-6),
+                  reverse=True)
+
+
+def main(argv=None):
+    '''I am the main method'''
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and not [arg for arg in argv if arg.startswith("-")]:
+        # only python files, as given by editors and hooks: the default options apply, there is
+        # no need to import and build the whole argument parser
+        sys.exit(0 if processFiles(discoverFiles(argv), BatchReport()) else 1)
+
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("filenames", nargs="*", metavar="python file",
+                        help="file to check and sort in place, or directory containing them")
+    parser.add_argument("--staged", action="store_true",
+                        help="check the python files staged in the git index instead")
+    parser.add_argument("--fix", action="store_true",
+                        help="with --staged, write the sorted files back to the index and to the "
+                        "working tree")
+    parser.add_argument("--diff", action="store_true",
+                        help="do not modify the python files, print the unified diff of their "
+                        "import statements instead")
+    parser.add_argument("-U", "--unified", type=int, default=3, metavar="N",
+                        help="with --diff, number of lines of context (default: 3)")
+    parser.add_argument("--timings", type=int, metavar="N",
+                        help="print the N slowest files at the end of the run")
+    parser.add_argument("--report", metavar="FILE",
+                        help="write the statistics of each file as JSON in FILE")
+    parser.add_argument("--trend", metavar="FILE",
+                        help="append the statistics of the run to the JSON trend file FILE and "
+                        "print the files that became slower")
+    parser.add_argument("--label", help="label of the run in the report, eg, a build number")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N",
+                        help="process the python files in N worker processes. When no file "
+                        "completes during 2*SECONDS+1 with --timeout, or %d seconds without, the "
+                        "busy workers are considered hung: their files are skipped and the run "
+                        "fails" % (DEFAULT_HANG_TIMEOUT))
+    parser.add_argument("--max-bytes", type=int, metavar="N",
+                        help="do not sort files bigger than N bytes")
+    parser.add_argument("--max-lines", type=int, metavar="N",
+                        help="do not sort files of more than N lines")
+    parser.add_argument("--timeout", type=float, metavar="SECONDS",
+                        help="stop sorting a file after SECONDS")
+    parser.add_argument("--oversized", choices=["skip", "check"], default="skip",
+                        help="what to do with the files exceeding a limit: skip them (default) "
+                        "or only check them, without sorting them. A skipped file does not fail "
+                        "the run")
+    parser.add_argument("--merge", nargs="+", metavar="REPORT",
+                        help="do not process any file, combine the given reports instead, eg, "
+                        "the reports of all the shards. Their errors are printed and the exit "
+                        "status is the one of the whole run")
+    parser.add_argument("--shard", metavar="I/N",
+                        help="only process the I-th of N shards of the files, balanced by cost")
+    parser.add_argument("--costs", metavar="FILE",
+                        help="with --shard, use the timings recorded in this report or trend "
+                        "file as cost instead of the file sizes")
+    args = parser.parse_args(argv)
+    if len([mode for mode in (args.filenames, args.staged, args.merge) if mode]) != 1:
+        parser.error("give either python files, --staged or --merge")
+    if args.fix and not args.staged:
+        parser.error("--fix can only be used with --staged")
+    if args.diff and not args.filenames:
+        parser.error("--diff can only be used with python files")
+    if args.unified < 0:
+        parser.error("-U/--unified cannot be negative")
+    if args.shard:
+        shard_match = re.match(r"^(\d+)/(\d+)$", args.shard)
+        if (not args.filenames or not shard_match or
+                not 1 <= int(shard_match.group(1)) <= int(shard_match.group(2))):
+            parser.error("--shard I/N, with 1 <= I <= N, can only be used with python files")
+    elif args.costs:
+        parser.error("--costs can only be used with --shard")
+    if args.jobs > 1 and not args.filenames:
+        parser.error("--jobs can only be used with python files")
+    limits = FileLimits(args.max_bytes, args.max_lines, args.timeout, args.oversized)
+
+    res = True
+    if args.merge:
+        report = BatchReport.merge([BatchReport.read(filename) for filename in args.merge],
+                                   label=args.label)
+        for entry in report.files:
+            for message in entry.get("diagnostics", []):
+                print message
+        res = report.status()
+    else:
+        report = BatchReport(label=args.label, shard=args.shard)
+        if args.staged:
+            res = checkStagedFiles(fix=args.fix, report=report, limits=limits)
+        else:
+            filenames = discoverFiles(args.filenames)
+            if args.shard:
+                filenames = shardFiles(filenames, int(shard_match.group(1)),
+                                       int(shard_match.group(2)),
+                                       loadCosts(args.costs) if args.costs else None)
+            res = processFiles(filenames, report, limits, args.jobs,
+                               args.unified if args.diff else None)
+
+    if args.timings:
+        report.printSummary(args.timings)
+    if args.report:
+        report.write(args.report)
+    if args.trend:
+        previous = appendToTrend(args.trend, report)
+        if previous is not None:
+            for filename, before, after in findRegressions(previous, report):
+                print "slower than previous run: %.3fs -> %.3fs  %s" % (before, after, filename)
+    sys.exit(0 if res else 1)
 
 if __name__ == "__main__":
     main()
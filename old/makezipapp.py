@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+'''
+Build checkimports.pyz, a single-file distribution of checkimports.py made to start fast: it is
+run in isolated mode (python -E -S, no environment variable and no site-packages) and its modules
+are stored along with their bytecode, so nothing is compiled when it starts
+'''
+
+import argparse
+import imp
+import marshal
+import os
+import struct
+import sys
+import time
+import zipfile
+
+
+_mainSource = "import checkimports\ncheckimports.main()\n"
+# resolved on import, the working directory may change afterwards
+CHECKIMPORTS_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     "checkimports.py")
+
+
+def compiledModule(source, filename, mtime):
+    '''I return the content of the .pyc file of the given module source'''
+    code = compile(source, filename, "exec")
+    return imp.get_magic() + struct.pack("<I", mtime) + marshal.dumps(code)
+
+
+def buildZipapp(target, interpreter=None):
+    '''
+    I write the zip application running checkimports.main() in target. The interpreter of its
+    shebang line defaults to the current one
+    '''
+    interpreter = interpreter or sys.executable
+    with open(CHECKIMPORTS_FILENAME, 'rb') as filedesc:
+        modules = [("checkimports", filedesc.read()), ("__main__", _mainSource)]
+
+    # zipimport only uses a .pyc whose timestamp matches the one of its .py entry, whose
+    # resolution is two seconds
+    mtime = int(time.time()) & ~1
+    date_time = time.localtime(mtime)[:6]
+    with open(target, 'wb') as filedesc:
+        filedesc.write("#!%s -ES\n" % (interpreter))
+        with zipfile.ZipFile(filedesc, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, source in modules:
+                archive.writestr(zipfile.ZipInfo(name + ".py", date_time), source,
+                                 zipfile.ZIP_DEFLATED)
+                archive.writestr(zipfile.ZipInfo(name + ".pyc", date_time),
+                                 compiledModule(source, name + ".py", mtime),
+                                 zipfile.ZIP_DEFLATED)
+    os.chmod(target, 0755)
+
+
+def main():
+    '''I am the main method'''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("target", nargs="?", default="checkimports.pyz",
+                        help="zip application to write (default: checkimports.pyz)")
+    parser.add_argument("--python", metavar="INTERPRETER",
+                        help="interpreter of the shebang line (default: the current one)")
+    args = parser.parse_args()
+    buildZipapp(args.target, args.python)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+'''
+Differential equivalence harness between the frozen reference CheckImports and the optimized
+engines.
+
+A corpus of random python sources is generated from a seed, each source is processed by both
+engines and the results (return value, output and diagnostics) are compared byte for byte. A
+failing source is shrunk to a minimal example before being reported.
+'''
+
+import codecs
+import random
+
+from scripts.checkimports import CheckImports
+from scripts.tests.legacy_checkimports import CheckImports as LegacyCheckImports
+
+
+METHODS = ("checkData", "sortImportGroups")
+
+_recordingEngines = {}
+
+
+def recordingEngine(engineClass):
+    '''I return a subclass of engineClass recording its diagnostics instead of printing them'''
+    if engineClass not in _recordingEngines:
+
+        class RecordingEngine(engineClass):
+
+            '''I record the diagnostics in self.diagnostics'''
+
+            def __init__(self, *args, **kwargs):
+                engineClass.__init__(self, *args, **kwargs)
+                self.diagnostics = []
+
+            def printErrorMsg(self, filename, lineNb, errorMessage):
+                '''I record the error message'''
+                if self._writeError:
+                    self.diagnostics.append((filename, lineNb, errorMessage))
+
+        _recordingEngines[engineClass] = RecordingEngine
+    return _recordingEngines[engineClass]
+
+
+def runEngine(engineClass, method, data, filename="corpus.py"):
+    '''
+    I run the given method of a fresh engine and return its (result, diagnostics). An exception
+    is reported as the result so engines raising the same way still compare equal
+    '''
+    engine = recordingEngine(engineClass)()
+    try:
+        result = getattr(engine, method)(filename, data)
+    except Exception as e:
+        result = ("exception", e.__class__.__name__)
+    return result, engine.diagnostics
+
+
+def compareEngines(data, candidate=CheckImports, reference=LegacyCheckImports, methods=METHODS):
+    '''
+    I return None if the candidate engine behaves exactly as the reference one on data, or a
+    description of the first difference I find
+    '''
+    # The reference engine mangles CRLF sources and does not see the import on the first line of
+    # a source starting with an UTF-8 BOM: such sources are expected to give the same results
+    # than their LF counterpart without BOM
+    crlf = "\r\n" in data
+    bom = codecs.BOM_UTF8 if data.startswith(codecs.BOM_UTF8) else ""
+    reference_data = data[len(bom):]
+    if crlf:
+        reference_data = reference_data.replace("\r\n", "\n")
+    for method in methods:
+        expected = runEngine(reference, method, reference_data)
+        if isinstance(expected[0], tuple) and expected[0][0] in (True, False):
+            output = expected[0][1]
+            if crlf:
+                output = output.replace("\n", "\r\n")
+            expected = ((expected[0][0], bom + output), expected[1])
+        actual = runEngine(candidate, method, data)
+        # True == 1: the types of the results are compared too
+        if (actual != expected or not isinstance(actual[0], type(expected[0])) or
+                not isinstance(expected[0], type(actual[0]))):
+            return ("%s:\n  reference: %r\n  candidate: %r" % (method, expected, actual))
+    return None
+
+
+class CorpusGenerator(object):
+
+    '''
+    I generate random python sources stressing the subtle parts of sortImportGroups: comma
+    splitting, mixed import and from/import groups, comments, separators, malformed lines, CRLF
+    line endings and UTF-8 byte order marks
+    '''
+
+    _names = ["a", "b", "B", "os", "os2", "sys", "_x", "x_1", "Z"]
+
+    def __init__(self, seed=0):
+        self._random = random.Random(seed)
+
+    def moduleName(self):
+        '''I return a random dotted module name'''
+        return ".".join(self._random.choice(self._names)
+                        for _ in range(self._random.randint(1, 3)))
+
+    def importLine(self):
+        '''I return a random, possibly malformed, import line'''
+        rnd = self._random
+        if rnd.random() < 0.4:
+            line = "import %s" % self.moduleName()
+            if rnd.random() < 0.2:
+                line += " as %s" % rnd.choice(self._names)
+            if rnd.random() < 0.1:
+                line += ", %s" % self.moduleName()
+        else:
+            names = [rnd.choice(self._names) for _ in range(rnd.choice([1, 1, 1, 2, 3]))]
+            line = "from %s import %s" % (self.moduleName(),
+                                          rnd.choice([", ", ",", " , "]).join(names))
+            if rnd.random() < 0.05:
+                line += ","
+        if rnd.random() < 0.1:
+            line = line.replace(" ", rnd.choice(["  ", "\t"]), 1)
+        if rnd.random() < 0.1:
+            line += rnd.choice(["  # comment", "  # a, b", "#", " ", "\t"])
+        if rnd.random() < 0.05:
+            line += rnd.choice(["; import os", " \\", " (", "\x0c"])
+        return line
+
+    _otherLines = ["", "", "", " ", "\t", "# comment", "#import os", "x = 1", "def function():",
+                   "    pass", "    import indented", "import_x = 1", "from_y = 2"]
+    # Truncated statements: in CRLF sources, the '\r' ending them must not be taken for the
+    # whitespace following 'import'
+    _truncatedLines = ["import", "from a import", "from a.b  import"]
+
+    def otherLine(self):
+        '''I return a random line which is not an import statement'''
+        if self._random.random() < 0.2:
+            return self._random.choice(self._truncatedLines)
+        return self._random.choice(self._otherLines)
+
+    def generate(self):
+        '''I return a random python source'''
+        rnd = self._random
+        newline = rnd.choice(["\n", "\n", "\n", "\r\n"])
+        lines = []
+        for _ in range(rnd.randint(0, 6)):
+            lines.extend(self.importLine() for _ in range(rnd.randint(1, 6)))
+            lines.extend(self.otherLine() for _ in range(rnd.randint(0, 2)))
+        bom = codecs.BOM_UTF8 if rnd.random() < 0.05 else ""
+        return bom + newline.join(lines) + rnd.choice(["", newline, newline * 2])
+
+    def corpus(self, count):
+        '''I yield count random python sources'''
+        for _ in range(count):
+            yield self.generate()
+
+
+def _splitItems(line):
+    '''I return simplified variants of line, obtained by removing one comma separated item'''
+    items = line.split(",")
+    for i in range(len(items)):
+        if len(items) > 1:
+            yield ",".join(items[:i] + items[i + 1:])
+    if "#" in line:
+        yield line.partition("#")[0].rstrip()
+
+
+def shrink(data, isFailing):
+    '''
+    I reduce data to a minimal source for which isFailing(source) is still True: chunks of lines
+    are removed first, then single lines are simplified
+    '''
+    newline = "\r\n" if "\r\n" in data else "\n"
+    lines = data.split(newline)
+    progress = True
+    while progress:
+        progress = False
+        chunk = max(len(lines) // 2, 1)
+        while chunk >= 1:
+            i = 0
+            while i < len(lines):
+                candidate = lines[:i] + lines[i + chunk:]
+                if isFailing(newline.join(candidate)):
+                    lines = candidate
+                    progress = True
+                else:
+                    i += chunk
+            chunk //= 2
+        for i, line in enumerate(lines):
+            for simpler in _splitItems(line):
+                candidate = lines[:i] + [simpler] + lines[i + 1:]
+                if isFailing(newline.join(candidate)):
+                    lines = candidate
+                    progress = True
+                    break
+    return newline.join(lines)
+
+
+def findMismatch(candidate=CheckImports, reference=LegacyCheckImports, count=1000, seed=0,
+                 methods=METHODS):
+    '''
+    I compare both engines on a random corpus and return None if they always agree, or a
+    (minimalSource, description) tuple for the first mismatch
+    '''
+    def isFailing(data):
+        '''I return True if the engines disagree on data'''
+        return compareEngines(data, candidate, reference, methods) is not None
+
+    for data in CorpusGenerator(seed).corpus(count):
+        if isFailing(data):
+            minimal = shrink(data, isFailing)
+            return minimal, compareEngines(minimal, candidate, reference, methods)
+    return None
@@ -0,0 +1,31 @@
+'''Base test case of the tests working on files'''
+
+import os
+
+from mock import Mock
+from twisted.trial import unittest
+
+from scripts.checkimports import CheckImports
+
+
+class FileTestCase(unittest.TestCase):
+
+    '''I provide a temporary directory to write files in, the error printing is mocked'''
+
+    def setUp(self):
+        '''I mock the error printing and create the test directory'''
+        self.patch(CheckImports, "printErrorMsg", Mock())
+        self.directory = os.path.abspath(self.mktemp())
+        os.makedirs(self.directory)
+
+    def writeFile(self, name, content):
+        '''I write a file in the test directory and return its name'''
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'wb') as filedesc:
+            filedesc.write(content)
+        return filename
+
+    def readFile(self, filename):
+        '''I read a file, given by its name or by its path in the test directory'''
+        with open(os.path.join(self.directory, filename), 'rb') as filedesc:
+            return filedesc.read()
@@ -0,0 +1,96 @@
+'''
+Cold start benchmark of checkimports.py, as run from editors and hooks on a single file.
+
+Each command is run several times, in a fresh interpreter, on a small file already sorted and its
+median wall time is reported. The zip application built by makezipapp.py must start within the
+target, a few tens of milliseconds. With a trend file, the times are recorded as the ones of a
+batch run so a slower start is reported as a regression:
+
+    python -m scripts.tests.startup [--runs N] [--target MS] [--trend FILE]
+'''
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from scripts.checkimports import BatchReport
+from scripts.checkimports import appendToTrend
+from scripts.checkimports import findRegressions
+from scripts.makezipapp import CHECKIMPORTS_FILENAME
+from scripts.makezipapp import buildZipapp
+
+
+_sample = "'''sample'''\n\nimport os\nimport sys\n\nfrom array import array\n\n\nx = array('l')\n"
+
+# modules checkimports.py must not import to check a single file
+HEAVY_MODULES = ("argparse", "json", "multiprocessing", "subprocess")
+
+
+def coldStart(command, runs=20):
+    '''I return the median wall time, in seconds, of runs executions of command'''
+    durations = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(runs):
+            start = time.time()
+            subprocess.call(command, stdout=devnull, stderr=devnull)
+            durations.append(time.time() - start)
+    durations.sort()
+    return durations[len(durations) // 2]
+
+
+def startupTimes(directory, runs=20):
+    '''
+    I build the zip application in directory and return the (name, seconds) cold start times of
+    the bare interpreter, of checkimports.py run as a script and of the zip application
+    '''
+    zipapp = os.path.join(directory, "checkimports.pyz")
+    buildZipapp(zipapp)
+    sample = os.path.join(directory, "sample.py")
+    with open(sample, 'wb') as filedesc:
+        filedesc.write(_sample)
+    return [("interpreter", coldStart([sys.executable, "-E", "-S", "-c", "pass"], runs)),
+            ("script", coldStart([sys.executable, CHECKIMPORTS_FILENAME, sample], runs)),
+            ("zipapp", coldStart([sys.executable, "-E", "-S", zipapp, sample], runs))]
+
+
+def main():
+    '''I am the main method'''
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, metavar="N",
+                        help="number of runs of each command (default: 20)")
+    parser.add_argument("--target", type=float, default=50, metavar="MS",
+                        help="cold start time of the zip application not to exceed, in "
+                        "milliseconds (default: 50)")
+    parser.add_argument("--trend", metavar="FILE",
+                        help="append the times to the JSON trend file FILE and print the "
+                        "commands that became slower")
+    parser.add_argument("--label", help="label of the run in the trend file")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        times = startupTimes(directory, args.runs)
+    finally:
+        shutil.rmtree(directory)
+    report = BatchReport(label=args.label)
+    for name, duration in times:
+        print "%-12s %6.1fms" % (name, duration * 1000)
+        report.record("startup: %s" % (name), duration, {})
+    if args.trend:
+        previous = appendToTrend(args.trend, report)
+        if previous is not None:
+            for name, before, after in findRegressions(previous, report):
+                print "slower than previous run: %.1fms -> %.1fms  %s" % (before * 1000,
+                                                                          after * 1000, name)
+    res = dict(times)["zipapp"] * 1000 <= args.target
+    if not res:
+        print "the zip application starts in more than %gms" % (args.target)
+    sys.exit(0 if res else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
 '''Unit test for CheckImport class'''
 
+import codecs
+
 from mock import Mock
 from textwrap import dedent
 from twisted.trial import unittest
 
 from scripts.checkimports import CheckImports
+from scripts.checkimports import ImportLineCache
 
 
 # pylint: disable=W0212
@@ -232,6 +235,125 @@ class TestCheckImports(unittest.TestCase):
             """).lstrip()
         self.assertFalse(self.checkImports.checkData("filename", data))
 
+    def testGroupsOrderSeparators(self):
+        '''
+        I test only blank and comment-only lines reset the order check, and errors are reported
+        with the right line number
+        '''
+        data = dedent("""
+            import sys
+            # comment only line
+            import os
+            x = 1
+            import aaa  # bad order
+            def other_function():
+                import bbb  # indented, ignored
+
+            import ccc, ddd
+            """).lstrip()
+        self.assertFalse(self.checkImports.checkData("filename", data))
+        self.assertEqual([call[0] for call in self.checkImports.printErrorMsg.call_args_list],
+                         [('filename', 4, "Bad order for this import"),
+                          ('filename', 8,
+                           "multiple module imported on one line. Please import "
+                           "each module on a single line.")])
+
+    def testIterImportLines(self):
+        '''I test the whole buffer scanner only returns the import lines'''
+        data = dedent("""
+            import os
+            from module import stuff  # comment
+            import_should_not_be_found = 1
+
+              import with_indedent
+            from_should_not_be_found = 1
+            import
+            from module import other
+            """).lstrip()
+        self.assertEqual(list(self.checkImports.iterImportLines(data)),
+                         [(0, "import os", False),
+                          (1, "from module import stuff  # comment", False),
+                          (7, "from module import other", True)])
+
+    def testImportLineIndex(self):
+        '''I test the import lines are indexed by offsets and gathered in groups'''
+        data = dedent("""
+            import os
+            import sys
+            x = 1
+            from module import stuff
+            # comment
+            from module import other
+            """).lstrip()
+        index = self.checkImports.indexImportLines(data)
+        self.assertEqual(len(index), 4)
+        self.assertEqual(list(index.lineNbs), [0, 1, 3, 5])
+        self.assertEqual(list(index.resets), [False, False, False, True])
+        self.assertEqual(index.line(2), "from module import stuff")
+        self.assertEqual(data[index.starts[1]:index.ends[1]], "import sys")
+        self.assertEqual(list(index.groups()), [(0, 2), (2, 3), (3, 4)])
+
+    def testSortImportGroupsUnchanged(self):
+        '''I test an already sorted buffer is returned as is'''
+        data = "import os\nimport sys\n\nfrom module import stuff\n" + "x = 1\n" * 100
+        result, processed_data = self.checkImports.sortImportGroups("filename", data)
+        self.assertTrue(result)
+        self.assertIdentical(processed_data, data)
+
+    def testParseImportLine(self):
+        '''I test the parsed form of an import line'''
+        parsed = self.checkImports.parseImportLine("from module import foo, bar  # comment")
+        self.assertFalse(parsed.valid)
+        self.assertEqual(parsed.errors, ("multiple module imported on one line. "
+                                         "Please import each module on a single line.",))
+        self.assertTrue(parsed.fixable)
+        self.assertEqual(parsed.orderLine, "from module import foo, bar")
+        self.assertEqual(parsed.orderType, "from")
+        self.assertEqual(parsed.sortKeys, ((True, "from module import foo"),
+                                           (True, "from module import bar  # comment")))
+        parsed = self.checkImports.parseImportLine("import os")
+        self.assertTrue(parsed.valid)
+        self.assertEqual(parsed.orderKey, (False, "import os"))
+        self.assertEqual(parsed.sortKeys, ((False, "import os"),))
+
+    def testImportLineCache(self):
+        '''I test import lines are parsed once, and the oldest ones evicted'''
+        parse = Mock(side_effect=lambda line: line.upper())
+        cache = ImportLineCache(maxSize=4)
+        self.assertEqual(cache.get("import a", parse), "IMPORT A")
+        self.assertEqual(cache.get("import a", parse), "IMPORT A")
+        self.assertEqual(parse.call_count, 1)
+        for line in ["import b", "import c", "import a", "import d", "import e"]:
+            cache.get(line, parse)
+        self.assertTrue(len(cache) <= 4)
+        # recently used lines are kept, older ones are parsed again
+        cache.get("import a", parse)
+        self.assertEqual(parse.call_count, 5)
+        cache.get("import b", parse)
+        self.assertEqual(parse.call_count, 6)
+
+    def testSharedImportLineCache(self):
+        '''I test checkers can share their parsed lines'''
+        cache = ImportLineCache()
+        CheckImports(lineCache=cache).checkData("filename", "import os\nimport sys\n")
+        self.assertEqual(len(cache), 2)
+        self.assertFalse(CheckImports(lineCache=cache).checkData("filename", "import sys\nimport os\n"))
+        self.assertEqual(len(cache), 2)
+
+    def testSharedImportLineCacheDecoded(self):
+        '''I test decoded and byte string sources do not share their parsed lines'''
+        cache = ImportLineCache()
+        data = u"import sys\nimport os\n".encode("utf-16")
+        result, processed_data = CheckImports(lineCache=cache).sortSource("filename", data)
+        self.assertTrue(result)
+        self.assertEqual(processed_data, u"import os\nimport sys\n".encode("utf-16"))
+        data = "# -*- coding: latin-1 -*-\nimport sys\nimport os\nx = '\xe9'\n"
+        result, processed_data = CheckImports(lineCache=cache).sortSource("filename", data)
+        self.assertTrue(result)
+        self.assertEqual(processed_data,
+                         "# -*- coding: latin-1 -*-\nimport os\nimport sys\nx = '\xe9'\n")
+        self.assertEqual(len(cache), 4)
+
     def testSortImportGroups(self):
         ''''
         I test sorting several not mixed goups
@@ -313,6 +435,80 @@ class TestCheckImports(unittest.TestCase):
             """).lstrip()
         self.assertEqual(processed_data, sorted_data, "sort group failed")
 
+    def testSortImportGroupsCRLF(self):
+        '''I test the line endings of a CRLF file are kept, even for splitted lines'''
+        data = ("from module import stuff, foo\r\n"
+                "import os\r\n"
+                "\r\n"
+                "x = 1\r\n")
+        result, processed_data = self.checkImports.sortImportGroups("filename", data)
+        self.assertTrue(result)
+        self.assertEqual(processed_data, ("import os\r\n"
+                                          "\r\n"
+                                          "from module import foo\r\n"
+                                          "from module import stuff\r\n"
+                                          "\r\n"
+                                          "x = 1\r\n"))
+
+    def testSortImportGroupsCRLFTruncated(self):
+        '''I test a truncated statement is no more an import line in a CRLF file than in a LF one'''
+        for newline in ["\n", "\r\n"]:
+            data = newline.join(["import", "from a import", "import os", ""])
+            result, processed_data = self.checkImports.sortImportGroups("filename", data)
+            self.assertTrue(result)
+            self.assertIdentical(processed_data, data)
+
+    def testSortSourceWithByteOrderMark(self):
+        '''I test the first line of a file starting with an UTF-8 BOM is an import line'''
+        data = "\xef\xbb\xbfimport sys\nimport os\n"
+        self.assertEqual(self.checkImports.sourceEncoding(data), "utf-8")
+        result, processed_data = self.checkImports.sortSource("filename", data)
+        self.assertTrue(result)
+        self.assertEqual(processed_data, "\xef\xbb\xbfimport os\nimport sys\n")
+
+    def testSortSourceWithCodingCookie(self):
+        '''I test an ASCII compatible encoding is processed without being decoded'''
+        data = "# -*- coding: latin-1 -*-\nimport sys  # \xe9\nimport os\n"
+        self.assertEqual(self.checkImports.sourceEncoding(data), "latin-1")
+        self.assertTrue(self.checkImports.isAsciiCompatible("latin-1"))
+        result, processed_data = self.checkImports.sortSource("filename", data)
+        self.assertTrue(result)
+        self.assertEqual(processed_data, "# -*- coding: latin-1 -*-\nimport os\nimport sys  # \xe9\n")
+
+    def testSortSourceUTF16(self):
+        '''I test a file not encoded in an ASCII compatible encoding is decoded'''
+        data = codecs.BOM_UTF16_LE + u"import sys\r\nimport os\r\n".encode("utf-16-le")
+        self.assertEqual(self.checkImports.sourceEncoding(data), "utf-16-le")
+        self.assertFalse(self.checkImports.isAsciiCompatible("utf-16-le"))
+        result, processed_data = self.checkImports.sortSource("filename", data)
+        self.assertTrue(result)
+        self.assertEqual(processed_data,
+                         codecs.BOM_UTF16_LE + u"import os\r\nimport sys\r\n".encode("utf-16-le"))
+
+    def testSortSourceBigEndian(self):
+        '''I test the endianness declared by the byte order mark is kept'''
+        for bom, encoding in [(codecs.BOM_UTF16_BE, "utf-16-be"),
+                              (codecs.BOM_UTF32_BE, "utf-32-be")]:
+            data = bom + u"import sys\nimport os\n".encode(encoding)
+            result, processed_data = self.checkImports.sortSource("filename", data)
+            self.assertTrue(result)
+            self.assertEqual(processed_data, bom + u"import os\nimport sys\n".encode(encoding))
+            # already sorted: the very same content is returned
+            result, processed_data = self.checkImports.sortSource("filename", processed_data)
+            self.assertTrue(result)
+            self.assertEqual(processed_data, bom + u"import os\nimport sys\n".encode(encoding))
+
+    def testSortSourceUndecodable(self):
+        '''I test a file which cannot be decoded is reported as an error'''
+        data = codecs.BOM_UTF16_LE + u"import os\n".encode("utf-16-le")[:-1]
+        result, processed_data = self.checkImports.sortSource("filename", data)
+        self.assertFalse(result)
+        self.assertIdentical(processed_data, data)
+        self.assertTrue(self.checkImports.printErrorMsg.called)
+        result, diff = self.checkImports.diffSource("filename", data)
+        self.assertFalse(result)
+        self.assertEqual(diff, "")
+
     def testCompareImportLines(self):
         '''Unit test the line comparison method'''
         def asserter(line1, line2, expectedVal):
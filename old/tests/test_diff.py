@@ -0,0 +1,151 @@
+'''Unit test for the unified diff of the import statements'''
+
+from scripts.checkimports import BatchReport
+from scripts.checkimports import CheckImports
+from scripts.checkimports import FileLimits
+from scripts.checkimports import processFile
+from scripts.checkimports import processFiles
+from scripts.tests.fixtures import FileTestCase
+
+
+class TestDiff(FileTestCase):
+
+    '''I test the unified diff of the changes sortImportGroups would make'''
+
+    def testDiffImportGroups(self):
+        '''I test the diff only holds the changed group and its context'''
+        data = "'''doc'''\n\nimport sys\nimport os\n\nx = 1\ny = 2\nz = 3\nt = 4\n"
+        res, diff = CheckImports().diffImportGroups("a.py", data, 2)
+        self.assertTrue(res)
+        self.assertEqual(diff, "--- a/a.py\n"
+                               "+++ b/a.py\n"
+                               "@@ -1,6 +1,6 @@\n"
+                               " '''doc'''\n"
+                               " \n"
+                               "-import sys\n"
+                               "-import os\n"
+                               "+import os\n"
+                               "+import sys\n"
+                               " \n"
+                               " x = 1\n")
+
+    def testDiffImportGroupsSorted(self):
+        '''I test a sorted file gives an empty diff'''
+        res, diff = CheckImports().diffImportGroups("a.py", "import os\nimport sys\n")
+        self.assertTrue(res)
+        self.assertEqual(diff, "")
+
+    def testDiffImportGroupsError(self):
+        '''I test a file with errors gives no diff'''
+        res, diff = CheckImports().diffImportGroups("a.py", "import sys; import os\n")
+        self.assertFalse(res)
+        self.assertEqual(diff, "")
+
+    def testDiffImportGroupsHunks(self):
+        '''I test close groups share a hunk and the line numbers of the next hunks'''
+        data = ("from m import sys, os\n\nimport b\nimport a\n" + "x = 1\n" * 8 +
+                "import d\nimport c\n")
+        res, diff = CheckImports().diffImportGroups("a.py", data, 1)
+        self.assertTrue(res)
+        self.assertEqual(diff, "--- a/a.py\n"
+                               "+++ b/a.py\n"
+                               "@@ -1,5 +1,6 @@\n"
+                               "-from m import sys, os\n"
+                               "+from m import os\n"
+                               "+from m import sys\n"
+                               " \n"
+                               "-import b\n"
+                               "-import a\n"
+                               "+import a\n"
+                               "+import b\n"
+                               " x = 1\n"
+                               "@@ -12,3 +13,3 @@\n"
+                               " x = 1\n"
+                               "-import d\n"
+                               "-import c\n"
+                               "+import c\n"
+                               "+import d\n")
+
+    def testDiffImportGroupsNoNewline(self):
+        '''I test the diff of a file without newline at its end'''
+        res, diff = CheckImports().diffImportGroups("a.py", "import sys\nimport os", 3)
+        self.assertTrue(res)
+        self.assertEqual(diff, "--- a/a.py\n"
+                               "+++ b/a.py\n"
+                               "@@ -1,2 +1,2 @@\n"
+                               "-import sys\n"
+                               "-import os\n"
+                               "\\ No newline at end of file\n"
+                               "+import os\n"
+                               "+import sys\n"
+                               "\\ No newline at end of file\n")
+
+    def testDiffImportGroupsByteOrderMark(self):
+        '''I test the UTF-8 BOM of a file starting with an import line is kept in the diff'''
+        data = "\xef\xbb\xbfimport b\nimport a\nx = 1\n"
+        res, diff = CheckImports().diffImportGroups("a.py", data, 3)
+        self.assertTrue(res)
+        self.assertEqual(diff, "--- a/a.py\n"
+                               "+++ b/a.py\n"
+                               "@@ -1,3 +1,3 @@\n"
+                               "-\xef\xbb\xbfimport b\n"
+                               "-import a\n"
+                               "+\xef\xbb\xbfimport a\n"
+                               "+import b\n"
+                               " x = 1\n")
+        res, diff = CheckImports().diffImportGroups("a.py", data, 0)
+        self.assertTrue(res)
+        self.assertEqual(diff, "--- a/a.py\n"
+                               "+++ b/a.py\n"
+                               "@@ -1,2 +1,2 @@\n"
+                               "-\xef\xbb\xbfimport b\n"
+                               "-import a\n"
+                               "+\xef\xbb\xbfimport a\n"
+                               "+import b\n")
+
+    def testDiffSourceUTF16(self):
+        '''I test the diff of a decoded file is UTF-8 encoded'''
+        data = u"# \xe9\nimport sys\nimport os\n".encode("utf-16")
+        res, diff = CheckImports().diffSource("a.py", data)
+        self.assertTrue(res)
+        self.assertIn(u"# \xe9\n".encode("utf-8"), diff)
+        self.assertIn("+import os\n+import sys\n", diff)
+
+    def testDiffSourceUTF16Filename(self):
+        '''I test the name of a decoded file is not decoded'''
+        data = u"import sys\nimport os\n".encode("utf-16")
+        res, diff = CheckImports().diffSource("\xc3\xa9.py", data, 0)
+        self.assertTrue(res)
+        self.assertEqual(diff, "--- a/\xc3\xa9.py\n"
+                               "+++ b/\xc3\xa9.py\n"
+                               "@@ -1,2 +1,2 @@\n"
+                               "-import sys\n"
+                               "-import os\n"
+                               "+import os\n"
+                               "+import sys\n")
+
+    def testProcessFile(self):
+        '''I test the diff mode leaves the file untouched'''
+        filename = self.writeFile("a.py", "import sys\nimport os\n")
+        entry, messages = processFile(filename, diff=3)
+        self.assertTrue(entry["status"])
+        self.assertEqual(messages, ["--- a/%s\n+++ b/%s\n@@ -1,2 +1,2 @@\n"
+                                    "-import sys\n-import os\n+import os\n+import sys"
+                                    % (filename, filename)])
+        self.assertEqual(self.readFile(filename), "import sys\nimport os\n")
+
+    def testProcessFileSkipped(self):
+        '''I test a skipped file gives no diff'''
+        filename = self.writeFile("a.py", "import sys\nimport os\n")
+        entry, messages = processFile(filename, FileLimits(maxLines=1), diff=3)
+        self.assertTrue(entry["status"])
+        self.assertEqual(messages, ["skipped, more than 1 lines: %s" % (filename)])
+
+    def testProcessFilesParallel(self):
+        '''I test the diff mode in worker processes'''
+        filenames = [self.writeFile("%d.py" % (i), "import sys\nimport os\n") for i in range(3)]
+        report = BatchReport()
+        self.assertTrue(processFiles(filenames, report, jobs=2, diff=0))
+        for filename in filenames:
+            self.assertEqual(self.readFile(filename), "import sys\nimport os\n")
+        self.assertEqual(len(report.files), 3)
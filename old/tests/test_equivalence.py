@@ -0,0 +1,78 @@
+'''Differential tests between the optimized CheckImports and the frozen reference copy'''
+
+from twisted.trial import unittest
+
+from scripts.checkimports import CheckImports
+from scripts.checkimports import ImportLineCache
+from scripts.tests.equivalence import CorpusGenerator
+from scripts.tests.equivalence import compareEngines
+from scripts.tests.equivalence import findMismatch
+from scripts.tests.equivalence import shrink
+
+
+class BrokenCheckImports(CheckImports):
+
+    '''I forget to reset the order check on blank lines'''
+
+    def iterImportLines(self, data):
+        for line_nb, line, _ in CheckImports.iterImportLines(self, data):
+            yield line_nb, line, False
+
+
+class SharedCacheCheckImports(CheckImports):
+
+    '''I share a tiny cache of parsed lines with all my instances, to exercise evictions'''
+
+    sharedLineCache = ImportLineCache(maxSize=16)
+
+    def __init__(self):
+        CheckImports.__init__(self, lineCache=self.sharedLineCache)
+
+
+class TestEquivalence(unittest.TestCase):
+
+    '''
+    I check the optimized engine gives exactly the same results and diagnostics than the
+    reference one on a random corpus
+    '''
+
+    def testCorpusIsDeterministic(self):
+        '''I test the same seed always generates the same corpus'''
+        self.assertEqual(list(CorpusGenerator(42).corpus(20)),
+                         list(CorpusGenerator(42).corpus(20)))
+
+    def testRandomCorpus(self):
+        '''I test the current engine against the reference one'''
+        mismatch = findMismatch(count=2000, seed=1)
+        self.assertEqual(mismatch, None,
+                         "mismatch on:\n%s\n%s" % mismatch if mismatch else "")
+
+    def testRandomCorpusSharedCache(self):
+        '''I test the parsed lines shared between files do not change the results'''
+        mismatch = findMismatch(candidate=SharedCacheCheckImports, count=1000, seed=2)
+        self.assertEqual(mismatch, None,
+                         "mismatch on:\n%s\n%s" % mismatch if mismatch else "")
+
+    def testHandWrittenCases(self):
+        '''I test a few known tricky inputs'''
+        for data in ["import b\nx = 1\nimport a",
+                     "import b\n# comment\nimport a",
+                     "from a import b, c; import d",
+                     "from a import (b, c",
+                     "from a import b,\nimport a",
+                     "import a, b\nimport c\n",
+                     "\xef\xbb\xbfimport b\nimport a\n",
+                     "\xef\xbb\xbfx = 1\r\nimport b\r\nimport a",
+                     "import\r\nfrom a import\r\nimport b\r\nimport a\r\n"]:
+            self.assertEqual(compareEngines(data), None)
+
+    def testShrink(self):
+        '''I test a failing source is reduced to a minimal example'''
+        mismatch = findMismatch(candidate=BrokenCheckImports, count=2000, seed=1)
+        self.assertNotEqual(mismatch, None)
+        minimal, description = mismatch
+        self.assertTrue(compareEngines(minimal, candidate=BrokenCheckImports) is not None)
+        self.assertTrue(len(minimal.split("\n")) <= 3, minimal)
+        self.assertEqual(shrink(minimal,
+                                lambda data: compareEngines(data, BrokenCheckImports) is not None),
+                         minimal)
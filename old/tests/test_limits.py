@@ -0,0 +1,133 @@
+'''Unit test for the per-file limits of batch runs'''
+
+import os
+import time
+
+from scripts import checkimports
+from scripts.checkimports import BatchReport
+from scripts.checkimports import CheckImports
+from scripts.checkimports import FileLimits
+from scripts.checkimports import processFile
+from scripts.checkimports import processFiles
+from scripts.checkimports import sortData
+from scripts.tests.fixtures import FileTestCase
+
+
+class TestFileLimits(FileTestCase):
+
+    '''I test files exceeding a limit are skipped or only checked'''
+
+    def slowSortSource(self, filename, data):
+        '''I take too long to sort a file'''
+        time.sleep(1)
+
+    def testExceeded(self):
+        '''I test the size limits'''
+        limits = FileLimits(maxBytes=20, maxLines=2)
+        self.assertEqual(limits.exceeded("import os\nimport sys"), None)
+        self.assertEqual(limits.exceeded("import os\n\n\n"), "more than 2 lines")
+        self.assertEqual(limits.exceeded("import os\nimport sys, re"), "more than 20 bytes")
+
+    def testSortDataSkipped(self):
+        '''I test a file exceeding a limit is left unchanged'''
+        data = "import sys\nimport os\n"
+        _, res, content, skipped = sortData("filename", data, FileLimits(maxLines=1))
+        self.assertTrue(res)
+        self.assertIdentical(content, data)
+        self.assertEqual(skipped, "skipped, more than 1 lines")
+
+    def testSortDataOnlyChecked(self):
+        '''I test a file exceeding a limit can still be checked'''
+        data = "import sys\nimport os\n"
+        _, res, content, skipped = sortData("filename", data,
+                                            FileLimits(maxLines=1, oversized="check"))
+        self.assertFalse(res)
+        self.assertIdentical(content, data)
+        self.assertEqual(skipped, "only checked, more than 1 lines")
+
+    def testSortDataTimeout(self):
+        '''I test sorting a file is interrupted after the timeout'''
+        self.patch(CheckImports, "sortSource", self.slowSortSource)
+        start = time.time()
+        _, res, _, skipped = sortData("filename", "import os\n", FileLimits(timeout=0.1))
+        self.assertTrue(time.time() - start < 0.9)
+        self.assertTrue(res)
+        self.assertEqual(skipped, "skipped, more than 0.1s to sort")
+
+    def testProcessFileNotRead(self):
+        '''I test a file too big is neither read nor written'''
+        filename = self.writeFile("big.py", "import sys\nimport os\n")
+        entry, messages = processFile(filename, FileLimits(maxBytes=10))
+        self.assertTrue(entry["status"])
+        self.assertEqual(entry["skipped"], "skipped, more than 10 bytes")
+        self.assertEqual(messages, ["skipped, more than 10 bytes: %s" % (filename)])
+        self.assertEqual(self.readFile(filename), "import sys\nimport os\n")
+
+    def testProcessFileMissing(self):
+        '''I test a file which cannot be read is reported as failed'''
+        entry, messages = processFile(os.path.join(self.directory, "missing.py"))
+        self.assertFalse(entry["status"])
+        self.assertEqual(len(messages), 1)
+
+    def testProcessFilesInParallel(self):
+        '''I test the files are sorted by worker processes and recorded in order'''
+        filenames = [self.writeFile("module%d.py" % i, "import sys\nimport os\n")
+                     for i in range(5)]
+        report = BatchReport()
+        self.assertTrue(processFiles(filenames, report, FileLimits(maxLines=10), jobs=2))
+        self.assertEqual([entry["filename"] for entry in report.files], filenames)
+        for filename in filenames:
+            self.assertEqual(self.readFile(filename), "import os\nimport sys\n")
+
+    def testHungWorker(self):
+        '''I test a worker blocked out of the sort does not block the other files'''
+        fifo = os.path.join(self.directory, "fifo.py")
+        os.mkfifo(fifo)
+        filename = self.writeFile("module.py", "import sys\nimport os\n")
+        report = BatchReport()
+        self.assertFalse(processFiles([fifo, filename], report, FileLimits(timeout=0.1), jobs=2))
+        self.assertEqual(report.files[0]["skipped"], "skipped, worker hung")
+        self.assertTrue(report.files[1]["status"])
+        self.assertEqual(self.readFile(filename), "import os\nimport sys\n")
+
+    def testHungWorkers(self):
+        '''I test the files not started by hung workers are processed by new workers'''
+        fifos = [os.path.join(self.directory, "fifo%d.py" % (i)) for i in range(2)]
+        for fifo in fifos:
+            os.mkfifo(fifo)
+        filenames = [self.writeFile("%d.py" % (i), "import sys\nimport os\n") for i in range(3)]
+        report = BatchReport()
+        self.assertFalse(processFiles(fifos + filenames, report, FileLimits(timeout=0.1), jobs=2))
+        for entry in report.files[:2]:
+            self.assertEqual(entry["skipped"], "skipped, worker hung")
+        for entry in report.files[2:]:
+            self.assertTrue(entry["status"])
+            self.assertNotIn("skipped", entry)
+        for filename in filenames:
+            self.assertEqual(self.readFile(filename), "import os\nimport sys\n")
+
+    def testHungWorkerNoTimeout(self):
+        '''I test a hung worker is detected without timeout'''
+        self.patch(checkimports, "DEFAULT_HANG_TIMEOUT", 0.5)
+        fifo = os.path.join(self.directory, "fifo.py")
+        os.mkfifo(fifo)
+        filename = self.writeFile("module.py", "import sys\nimport os\n")
+        report = BatchReport()
+        self.assertFalse(processFiles([fifo, filename], report, jobs=2))
+        self.assertEqual(report.files[0]["skipped"], "skipped, worker hung")
+        self.assertTrue(report.files[1]["status"])
+
+    def crashingSortSource(self, filename, data):
+        '''I crash on the file named crash.py'''
+        if filename.endswith("crash.py"):
+            raise ValueError("crashed")
+        return True, data
+
+    def testCrashedWorker(self):
+        '''I test a file crashing its worker fails the run without blocking it'''
+        self.patch(CheckImports, "sortSource", self.crashingSortSource)
+        crash = self.writeFile("crash.py", "import os\n")
+        filename = self.writeFile("module.py", "import os\n")
+        report = BatchReport()
+        self.assertFalse(processFiles([crash, filename], report, jobs=2))
+        self.assertEqual([entry["status"] for entry in report.files], [False, True])
@@ -0,0 +1,77 @@
+'''Unit test for the batch run statistics'''
+
+import os
+
+from mock import Mock
+from twisted.trial import unittest
+
+from scripts.checkimports import BatchReport
+from scripts.checkimports import CheckImports
+from scripts.checkimports import appendToTrend
+from scripts.checkimports import findRegressions
+from scripts.checkimports import sortFile
+
+
+class TestBatchReport(unittest.TestCase):
+
+    '''I test the statistics recorded during a batch run'''
+
+    def setUp(self):
+        '''I mock the error printing'''
+        self.patch(CheckImports, "printErrorMsg", Mock())
+
+    def makeReport(self, times, label=None):
+        '''I return a report with the given time for each file'''
+        report = BatchReport(label=label)
+        for filename, duration in sorted(times.items()):
+            report.record(filename, duration, dict(lines=10, imports=2, largest_group=2))
+        return report
+
+    def testStats(self):
+        '''I test the statistics of the last sorted file'''
+        checker = CheckImports()
+        checker.sortImportGroups("filename", "import b\nimport a\n\nimport c\nx = 1")
+        self.assertEqual(checker.stats, dict(lines=5, imports=3, largest_group=2))
+
+    def testSortFileRecords(self):
+        '''I test sortFile records the statistics of the file'''
+        filename = self.mktemp()
+        with open(filename, 'wb') as filedesc:
+            filedesc.write("import b\nimport a\n")
+        report = BatchReport()
+        self.assertTrue(sortFile(filename, report))
+        self.assertEqual(len(report.files), 1)
+        self.assertEqual(report.files[0]["filename"], filename)
+        self.assertEqual(report.files[0]["imports"], 2)
+        self.assertTrue(report.files[0]["time"] >= 0)
+
+    def testSlowest(self):
+        '''I test the slowest files are returned first'''
+        report = self.makeReport({"a.py": 0.1, "b.py": 0.3, "c.py": 0.2})
+        self.assertEqual([entry["filename"] for entry in report.slowest(2)], ["b.py", "c.py"])
+
+    def testWriteAndRead(self):
+        '''I test a report is read back identical'''
+        report = self.makeReport({"a.py": 0.1}, label="build 1")
+        filename = self.mktemp()
+        report.write(filename)
+        self.assertEqual(BatchReport.read(filename).toDict(), report.toDict())
+
+    def testMerge(self):
+        '''I test reports are combined into one'''
+        merged = BatchReport.merge([self.makeReport({"a.py": 0.1}, label="build 1"),
+                                    self.makeReport({"b.py": 0.2})])
+        self.assertEqual(merged.label, "build 1")
+        self.assertEqual([entry["filename"] for entry in merged.files], ["a.py", "b.py"])
+
+    def testTrend(self):
+        '''I test the runs are appended to the trend file and regressions found'''
+        trend = self.mktemp()
+        self.assertEqual(appendToTrend(trend, self.makeReport({"a.py": 0.1, "b.py": 0.1})), None)
+        current = self.makeReport({"a.py": 0.1, "b.py": 0.5, "c.py": 1})
+        previous = appendToTrend(trend, current)
+        self.assertEqual(findRegressions(previous, current), [("b.py", 0.1, 0.5)])
+        appendToTrend(trend, current, maxRuns=2)
+        self.assertTrue(os.path.exists(trend))
+        with open(trend) as filedesc:
+            self.assertEqual(filedesc.read().count('"label"'), 2)
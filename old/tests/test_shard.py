@@ -0,0 +1,88 @@
+'''Unit test for the sharding of the files between CI nodes'''
+
+import os
+
+from twisted.trial import unittest
+
+from scripts.checkimports import BatchReport
+from scripts.checkimports import CheckImports
+from scripts.checkimports import appendToTrend
+from scripts.checkimports import discoverFiles
+from scripts.checkimports import loadCosts
+from scripts.checkimports import shardFiles
+
+
+class TestShard(unittest.TestCase):
+
+    '''I test the files are deterministically partitioned by cost'''
+
+    def setUp(self):
+        '''I create a tree of python files of different sizes'''
+        self.root = self.mktemp()
+        os.makedirs(os.path.join(self.root, "pkg"))
+        self.filenames = []
+        for i in range(1, 13):
+            filename = os.path.join(self.root, "pkg", "module%02d.py" % i)
+            with open(filename, 'wb') as filedesc:
+                filedesc.write("import os\n" + "x = 1\n" * 10 * i)
+            self.filenames.append(filename)
+        with open(os.path.join(self.root, "notes.txt"), 'wb') as filedesc:
+            filedesc.write("import os\n")
+
+    def size(self, filenames):
+        '''I return the total size of the given files'''
+        return sum(os.path.getsize(filename) for filename in filenames)
+
+    def testDiscoverFiles(self):
+        '''I test the python files are found in directories'''
+        notes = os.path.join(self.root, "notes.txt")
+        self.assertEqual(discoverFiles([notes, self.root, self.filenames[0]]),
+                         sorted(self.filenames + [notes]))
+
+    def testShardBySize(self):
+        '''I test the shards are disjoint, cover all the files and have the same size'''
+        shards = [shardFiles(self.filenames, i, 3) for i in range(1, 4)]
+        self.assertEqual(sorted(sum(shards, [])), self.filenames)
+        self.assertEqual(len(set(self.size(shard) for shard in shards)), 1)
+        self.assertEqual(shardFiles(list(reversed(self.filenames)), 2, 3), shards[1])
+
+    def testShardByRecordedTime(self):
+        '''I test recorded timings take precedence over the file sizes'''
+        report = BatchReport()
+        report.record(self.filenames[0], 100, {})
+        for filename in self.filenames[1:]:
+            report.record(filename, 1, {})
+        filename = self.mktemp()
+        report.write(filename)
+        costs = loadCosts(filename)
+        self.assertEqual(shardFiles(self.filenames, 1, 2, costs), [self.filenames[0]])
+        self.assertEqual(len(shardFiles(self.filenames, 2, 2, costs)), 11)
+
+    def testLoadCostsFromTrend(self):
+        '''I test the timings of the last run of a trend file are used'''
+        trend = self.mktemp()
+        for duration in (1, 2):
+            report = BatchReport()
+            report.record("module.py", duration, {})
+            appendToTrend(trend, report)
+        self.assertEqual(loadCosts(trend), {"module.py": 2})
+
+    def testMergeShards(self):
+        '''I test the diagnostics and status of the shards are combined'''
+        shard1 = BatchReport(shard="1/2")
+        shard1.record("a.py", 0.1, {}, True, [])
+        shard2 = BatchReport(shard="2/2")
+        shard2.record("b.py", 0.1, {}, False, ["b.py:3: Bad order for this import"])
+        self.assertTrue(shard1.status())
+        merged = BatchReport.merge([shard1, shard2])
+        self.assertFalse(merged.status())
+        self.assertFalse(merged.toDict()["status"])
+        self.assertEqual([entry["diagnostics"] for entry in merged.files],
+                         [[], ["b.py:3: Bad order for this import"]])
+
+    def testDiagnosticsRecorded(self):
+        '''I test the printed errors are kept by the checker'''
+        checker = CheckImports()
+        self.patch(checker, "_writeError", True)
+        checker.checkData("a.py", "import b\nimport a\n")
+        self.assertEqual(checker.diagnostics, ["a.py:1: Bad order for this import"])
@@ -0,0 +1,104 @@
+'''Unit test for the --staged mode'''
+
+import os
+import subprocess
+
+from scripts.checkimports import GitBlobReader
+from scripts.checkimports import checkStagedFiles
+from scripts.checkimports import listStagedFiles
+from scripts.checkimports import writeBlobs
+from scripts.tests.fixtures import FileTestCase
+
+
+class TestStaged(FileTestCase):
+
+    '''I test the staged files are read from the git index of the test directory'''
+
+    def setUp(self):
+        '''I create a git repository with a committed file'''
+        FileTestCase.setUp(self)
+        self.git("init", "-q")
+        self.git("config", "user.email", "test@example.com")
+        self.git("config", "user.name", "test")
+        self.writeFile("committed.py", "import os\nimport sys\n")
+        self.git("add", "committed.py")
+        self.git("commit", "-q", "-m", "initial commit")
+
+    def git(self, *args):
+        '''I run a git command in the test repository'''
+        return subprocess.check_output(("git",) + args, cwd=self.directory)
+
+    def readStaged(self, path):
+        '''I read a file of the git index'''
+        return self.git("show", ":" + path)
+
+    def testListStagedFiles(self):
+        '''I test only the added or modified python files are listed'''
+        self.writeFile("new.py", "import os\n")
+        self.writeFile("notes.txt", "import os\n")
+        self.writeFile("committed.py", "import sys\n")
+        self.git("add", "new.py", "notes.txt", "committed.py")
+        self.assertEqual(sorted(path for _, _, path in listStagedFiles(self.directory)),
+                         ["committed.py", "new.py"])
+
+    def testListStagedFilesFullSha(self):
+        '''I test the shas of the staged files are not abbreviated'''
+        self.writeFile("committed.py", "import sys\n")
+        self.git("add", "committed.py")
+        [(_, sha, _)] = listStagedFiles(self.directory)
+        self.assertEqual(sha, self.git("rev-parse", ":committed.py").strip())
+        self.assertEqual(len(sha), 40)
+
+    def testGitBlobReader(self):
+        '''I test several blobs are read through the same process'''
+        reader = GitBlobReader(self.directory)
+        try:
+            sha = self.git("rev-parse", ":committed.py").strip()
+            self.assertEqual(reader.read(sha), "import os\nimport sys\n")
+            self.assertEqual(reader.read(sha), "import os\nimport sys\n")
+            self.assertRaises(ValueError, reader.read, "0" * 40)
+        finally:
+            reader.close()
+
+    def testCheckStagedContent(self):
+        '''I test the staged content is checked, not the working tree'''
+        self.writeFile("committed.py", "import sys\nimport os\n")
+        self.git("add", "committed.py")
+        self.writeFile("committed.py", "import os\nimport sys\n")
+        self.assertFalse(checkStagedFiles(cwd=self.directory))
+        self.writeFile("committed.py", "import os\n")
+        self.git("add", "committed.py")
+        self.writeFile("committed.py", "import sys\nimport os\n")
+        self.assertTrue(checkStagedFiles(cwd=self.directory))
+
+    def testFixStagedFiles(self):
+        '''I test the sorted content is written to the index and the working tree'''
+        self.writeFile("committed.py", "import sys\nimport os\n")
+        self.writeFile("new.py", "from b import c, a\n")
+        self.git("add", "committed.py", "new.py")
+        self.writeFile("new.py", "from b import c, a\nx = 1\n")
+        self.assertTrue(checkStagedFiles(fix=True, cwd=self.directory))
+        self.assertEqual(self.readStaged("committed.py"), "import os\nimport sys\n")
+        self.assertEqual(self.readFile("committed.py"), "import os\nimport sys\n")
+        self.assertEqual(self.readStaged("new.py"), "from b import a\nfrom b import c\n")
+        # unstaged changes are never overwritten
+        self.assertEqual(self.readFile("new.py"), "from b import c, a\nx = 1\n")
+        self.assertTrue(checkStagedFiles(cwd=self.directory))
+
+    def testFixDeletedFile(self):
+        '''I test a staged file deleted from the working tree is sorted in the index only'''
+        self.writeFile("committed.py", "import sys\nimport os\n")
+        self.writeFile("new.py", "import sys\nimport os\n")
+        self.git("add", "committed.py", "new.py")
+        os.remove(os.path.join(self.directory, "committed.py"))
+        self.assertTrue(checkStagedFiles(fix=True, cwd=self.directory))
+        self.assertEqual(self.readStaged("committed.py"), "import os\nimport sys\n")
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "committed.py")))
+        self.assertEqual(self.readStaged("new.py"), "import os\nimport sys\n")
+        self.assertEqual(self.readFile("new.py"), "import os\nimport sys\n")
+
+    def testWriteBlobs(self):
+        '''I test several blobs are written through the same process'''
+        shas = writeBlobs(["import os\n", "import sys\n"], self.directory)
+        self.assertEqual([self.git("cat-file", "blob", sha) for sha in shas],
+                         ["import os\n", "import sys\n"])
@@ -0,0 +1,70 @@
+'''Unit test for the fast startup of checkimports.py and its zip application'''
+
+import os
+import subprocess
+import sys
+
+from scripts.checkimports import main
+from scripts.makezipapp import buildZipapp
+from scripts.tests.fixtures import FileTestCase
+from scripts.tests.startup import HEAVY_MODULES
+from scripts.tests.startup import coldStart
+
+
+class TestStartup(FileTestCase):
+
+    '''I test a single file is checked without importing more than needed'''
+
+    def setUp(self):
+        '''I build the zip application'''
+        FileTestCase.setUp(self)
+        self.zipapp = os.path.join(self.directory, "checkimports.pyz")
+        buildZipapp(self.zipapp)
+        self.filename = self.writeFile("a.py", "import sys\nimport os\n")
+
+    def runIsolated(self, code):
+        '''I run code in an isolated interpreter importing from the zip application'''
+        code = "import sys\nsys.path.insert(0, %r)\n%s" % (self.zipapp, code)
+        return subprocess.check_output([sys.executable, "-E", "-S", "-c", code])
+
+    def testZipapp(self):
+        '''I test the zip application sorts a file'''
+        self.assertEqual(subprocess.call([sys.executable, "-E", "-S", self.zipapp,
+                                          self.filename], stdout=open(os.devnull, 'w')), 0)
+        self.assertEqual(self.readFile(self.filename), "import os\nimport sys\n")
+
+    def testZipappBytecode(self):
+        '''I test the zip application does not compile its modules when it starts'''
+        output = self.runIsolated("import checkimports\nprint checkimports.__file__")
+        self.assertTrue(output.strip().endswith("checkimports.pyc"))
+
+    def testImportFootprint(self):
+        '''I test checking a single file does not import the modules of the other modes'''
+        output = self.runIsolated("import checkimports\n"
+                                  "sys.argv = ['checkimports', %r]\n"
+                                  "try:\n"
+                                  "    checkimports.main()\n"
+                                  "except SystemExit:\n"
+                                  "    pass\n"
+                                  "print ' '.join(sys.modules)" % (self.filename))
+        modules = output.splitlines()[-1].split()
+        self.assertIn("checkimports", modules)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, modules)
+        self.assertEqual(self.readFile(self.filename), "import os\nimport sys\n")
+
+    def testMainFiles(self):
+        '''I test the main method given python files only'''
+        exit = self.assertRaises(SystemExit, main, [self.filename])
+        self.assertEqual(exit.code, 0)
+        self.assertEqual(self.readFile(self.filename), "import os\nimport sys\n")
+
+    def testMainOptions(self):
+        '''I test the main method given options'''
+        exit = self.assertRaises(SystemExit, main, ["--diff", self.filename])
+        self.assertEqual(exit.code, 0)
+        self.assertEqual(self.readFile(self.filename), "import sys\nimport os\n")
+
+    def testColdStart(self):
+        '''I test the cold start time of a command'''
+        self.assertTrue(coldStart([sys.executable, "-E", "-S", "-c", "pass"], runs=3) > 0)